@@ -0,0 +1,79 @@
+import argparse
+import json
+import logging
+
+from ing_parser.benchmark import run_benchmarks, format_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parser on synthetic ING statements")
+
+    parser.add_argument(
+        "-n",
+        "--statements",
+        type=int,
+        required=False,
+        default=24,
+        help="Number of generated monthly statements (Default: 24)",
+    )
+    parser.add_argument(
+        "-t",
+        "--transactions",
+        type=int,
+        required=False,
+        default=40,
+        help="Transactions per statement (Default: 40)",
+    )
+    parser.add_argument(
+        "-p",
+        "--transactions-per-page",
+        type=int,
+        required=False,
+        default=25,
+        help="Transactions per PDF page (Default: 25)",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        required=False,
+        default=3,
+        help="Number of runs per stage (Default: 3)",
+    )
+    parser.add_argument(
+        "--stage",
+        type=str,
+        action="append",
+        required=False,
+        help="Only run this stage, can be repeated (Default: all stages)",
+    )
+    parser.add_argument(
+        "-d",
+        "--work-dir",
+        type=str,
+        required=False,
+        default=None,
+        help="Directory for the generated statements (Default: temporary directory)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        required=False,
+        default=None,
+        help="Write the results as JSON to this file",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    report = run_benchmarks(args.statements, args.transactions, args.transactions_per_page, args.repeat,
+                            args.work_dir, args.stage)
+
+    print(format_results(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,31 @@
+from __future__ import annotations
+
 import argparse
+import logging
 from pathlib import Path
-from sys import stderr
+from sys import stderr, argv
+from typing import Optional, Union, List, TYPE_CHECKING
+
+# -- Only modules without pandas, numpy or pypdf imports, the heavy ones are imported where they are needed
+from ing_parser.batch import FileLimits
+from ing_parser.cache import StatementCache, DEFAULT_MAX_SIZE
+from ing_parser.data import BankStatement, TransactionStore
+from ing_parser.folder import IngStatementsFolder, EXECUTORS
+from ing_parser.io.writer import write_transactions_csv, write_dataframe, require_pyarrow, newest_first, \
+    is_plain_csv, CSV_OPTIONS, OUTPUT_FORMATS, FORMAT_EXTENSIONS
+from ing_parser.profiling import Profiler, profile_stage
+from ing_parser.statement import IngStatement, add_statement_year, transactions_to_dataframe, amounts_in_cents
 
-from ing_parser.folder import IngStatementsFolder
-from ing_parser.statement import IngStatement
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def main():
-    parser = argparse.ArgumentParser()
+    if len(argv) > 1 and argv[1] == "query":
+        from scripts import ing_query_script
+        return ing_query_script.main(argv[2:])
+
+    parser = argparse.ArgumentParser(epilog="Use 'ingparser query --help' to query a transaction database")
 
     parser.add_argument(
         "path",
@@ -22,30 +40,329 @@ def main():
         type=str,
         required=False,
         default="giro",
-        help="Account type to parse if directory is specified e.g. Giro, Extra (Default: Giro)",
+        help="Account type to parse if directory is specified e.g. Giro, Extra or all (Default: Giro)",
+    )
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        action="store_true",
+        help="Search the directory and all of its sub directories for statements",
+    )
+    parser.add_argument(
+        "--per-account",
+        action="store_true",
+        help="Write one output per account, named <OUTPUT>_<IBAN>",
     )
     parser.add_argument(
         "-o",
         "--output",
         type=str,
         required=False,
-        default="ing_kontoauszug.csv",
-        help="Output file (Default: ing_kontoauszug.csv)",
+        default=None,
+        help="Output file, a directory with --partition (Default: ing_kontoauszug.<format extension>)",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        required=False,
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="Output format, parquet and feather keep column types and require pyarrow (Default: csv)",
+    )
+    parser.add_argument(
+        "--compression",
+        type=str,
+        required=False,
+        default=None,
+        help="Compression codec e.g. gzip, zstd, snappy, lz4 (Default: format default)",
+    )
+    parser.add_argument(
+        "--cents",
+        action="store_true",
+        help="Write amounts as exact integer cents instead of decimal euros",
+    )
+    parser.add_argument(
+        "--partition",
+        action="store_true",
+        help="Write one file per statement year into statement_year=YYYY sub directories of the output",
+    )
+    parser.add_argument(
+        "-e",
+        "--executor",
+        type=str,
+        required=False,
+        choices=EXECUTORS,
+        default="thread",
+        help="Backend used to parse a directory, 'process' uses all CPU cores (Default: thread)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        required=False,
+        default=None,
+        help="Number of parallel workers if directory is specified (Default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        required=False,
+        default=None,
+        help="Number of files sent to a worker process at once (Default: even split per worker)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        required=False,
+        default=None,
+        help="Directory of the parse cache (Default: user cache directory)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        required=False,
+        default=DEFAULT_MAX_SIZE // (1024 * 1024),
+        help=f"Maximum size of the parse cache in MB (Default: {DEFAULT_MAX_SIZE // (1024 * 1024)})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always parse the PDF files and do not use the parse cache",
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="Only parse new or changed files of a directory and merge them into the existing output",
+    )
+    parser.add_argument(
+        "-s",
+        "--stream",
+        action="store_true",
+        help="Write transactions while files are parsed in parallel, in statement order instead of sorted by date",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        required=False,
+        default=None,
+        metavar="ROWS",
+        help="Sort the csv output with an external merge in runs of ROWS transactions, "
+             "memory then depends on ROWS instead of the number of statements",
+    )
+    parser.add_argument(
+        "--all-pages",
+        action="store_true",
+        help="Extract text of all pages, including notice pages following the closing balance",
+    )
+    parser.add_argument(
+        "--db",
+        type=str,
+        required=False,
+        default=None,
+        help="Also store statements and transactions in this SQLite database, see 'ingparser query'",
+    )
+    parser.add_argument(
+        "--reconcile",
+        type=str,
+        required=False,
+        default=None,
+        metavar="PATH",
+        help="Check balances, statement numbers and booking dates and write a JSON report of all issues to PATH",
+    )
+    parser.add_argument(
+        "--dedup",
+        type=str,
+        required=False,
+        default=None,
+        metavar="PATH",
+        help="Skip duplicate files, statements and bookings of a directory and write a JSON report of them to PATH",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        required=False,
+        default=None,
+        metavar="SECONDS",
+        help="Parse every file of a directory in its own process and stop files that take longer than SECONDS",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        required=False,
+        default=None,
+        metavar="MB",
+        help="Parse every file of a directory in its own process and stop files that allocate more than MB",
+    )
+    parser.add_argument(
+        "--errors",
+        type=str,
+        required=False,
+        default=None,
+        metavar="PATH",
+        help="Parse every file of a directory in its own process, continue on failures and write a JSON report of "
+             "them to PATH",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        required=False,
+        default=None,
+        metavar="PATH",
+        help="Print time per parsing stage and write a JSON profile with Chrome trace events to PATH",
     )
     args = parser.parse_args()
 
     path = Path(args.path)
+    args.output = args.output or f"ing_kontoauszug{FORMAT_EXTENSIONS[args.format]}"
+    if args.incremental and (not is_plain_csv(args.output, args.format, args.partition, args.compression)
+                             or args.db or args.per_account or args.reconcile or args.cents or args.stream):
+        print("--incremental requires an uncompressed csv output without --partition, --db, --per-account, "
+              "--reconcile, --cents and --stream", file=stderr)
+        exit(1)
+    if (args.format != "csv" or args.db or args.per_account or args.reconcile) and args.stream:
+        print("--stream only supports the csv format without --db, --per-account and --reconcile", file=stderr)
+        exit(1)
+    if args.dedup and (args.incremental or not path.is_dir()):
+        print("--dedup requires a directory as INPUT and is not supported with --incremental", file=stderr)
+        exit(1)
+    isolated = args.timeout is not None or args.memory_limit is not None or args.errors
+    if isolated and (not path.is_dir() or (args.timeout is not None and args.timeout <= 0)
+                     or (args.memory_limit is not None and args.memory_limit < 1)):
+        print("--timeout, --memory-limit and --errors require a directory as INPUT and positive limits", file=stderr)
+        exit(1)
+    if args.chunk_size is not None and (not is_plain_csv(args.output, args.format, args.partition, args.compression)
+                                        or args.db or args.per_account or args.reconcile or args.incremental
+                                        or args.stream or args.chunk_size < 1):
+        print("--chunk-size requires a positive number of rows and an uncompressed csv output without --partition, "
+              "--db, --per-account, --reconcile, --incremental and --stream", file=stderr)
+        exit(1)
+    try:
+        require_pyarrow(args.format)
+    except ImportError as e:
+        print(e, file=stderr)
+        exit(1)
+
+    cache = None if args.no_cache else StatementCache(args.cache_dir, args.cache_size * 1024 * 1024)
+    profiler = Profiler() if args.profile else None
+    limits = FileLimits(args.timeout, args.memory_limit * 1024 * 1024 if args.memory_limit else None) \
+        if isolated else None
 
     if path.is_file() and path.suffix.casefold() == ".pdf":
-        df = IngStatement(path).dataframe
+        source = IngStatement(path, cache, skip_info_pages=not args.all_pages, profiler=profiler)
     elif path.is_dir():
-        df = IngStatementsFolder(path, args.account.lower()).dataframe
+        source = IngStatementsFolder(path, args.account.lower(), executor=args.executor,
+                                     max_workers=args.workers, chunksize=args.chunksize, cache=cache,
+                                     skip_info_pages=not args.all_pages, profiler=profiler,
+                                     recursive=args.recursive, deduplicate=bool(args.dedup),
+                                     limits=limits)
     else:
         print(f"Invalid input: {path}", file=stderr)
         exit(1)
 
-    df = df.sort_values("date", ascending=False)
-    df.to_csv(args.output, index=False, sep=";", quoting=1)
+    write_output(args, source, profiler)
+
+    statements = source.statements if isinstance(source, IngStatementsFolder) else [source]
+    if args.dedup and isinstance(source, IngStatementsFolder):
+        report = source.deduplicator.report
+        report.write_json(args.dedup)
+        for duplicate in report.files + report.statements:
+            logging.warning(f"Skipped {duplicate.file}, duplicate of {duplicate.duplicate_of}")
+        print(report.summary(), file=stderr)
+
+    if limits and isinstance(source, IngStatementsFolder):
+        if args.errors:
+            source.errors.write_json(args.errors)
+        print(source.errors.summary(), file=stderr)
+
+    if args.db:
+        from ing_parser.store import TransactionDatabase
+        with profile_stage(profiler, "store_db"):
+            TransactionDatabase(args.db).upsert_statements(statements)
+
+    if args.reconcile:
+        from ing_parser.reconcile import reconcile_statements, write_report
+        with profile_stage(profiler, "reconcile"):
+            issues = reconcile_statements(statements)
+        write_report(args.reconcile, issues, len(statements))
+        for issue in issues:
+            logging.warning(f"{issue.check} {issue.account_id} {issue.statement_year}/{issue.statement_number}: "
+                            f"{issue.message}")
+        print(f"Reconciled {len(statements)} statements, {len(issues)} issues", file=stderr)
+
+    if profiler:
+        print(profiler.summary(), file=stderr)
+        profiler.write_json(args.profile)
+
+
+def write_output(args, source: Union[IngStatement, IngStatementsFolder], profiler: Optional[Profiler]):
+    if args.incremental and isinstance(source, IngStatementsFolder):
+        from ing_parser.sync import IncrementalSync
+        IncrementalSync(source, args.output).run()
+        return
+
+    if args.stream or args.chunk_size:
+        # -- Folders are parsed in parallel, transactions still arrive in statement order
+        transactions = source.iter_transactions(parallel=True) if isinstance(source, IngStatementsFolder) \
+            else source.iter_transactions()
+        with profile_stage(profiler, "write_csv"):
+            if args.chunk_size:
+                from ing_parser.io.merge import write_sorted_transactions_csv
+                write_sorted_transactions_csv(args.output, transactions, args.chunk_size, args.cents)
+            else:
+                write_transactions_csv(args.output, transactions, args.cents)
+        return
+
+    if args.per_account and isinstance(source, IngStatementsFolder):
+        for account, statements in source.statements_by_account().items():
+            transactions = TransactionStore.concat(s.transactions for s in statements)
+            out_file = account_output(args.output, account)
+            if not write_plain_csv(args, transactions, out_file, profiler):
+                write_dataframe_output(args, transactions_to_dataframe(transactions, args.cents), statements,
+                                       out_file, profiler)
+        return
+
+    if is_plain_csv(args.output, args.format, args.partition, args.compression):
+        if isinstance(source, IngStatementsFolder):
+            transactions = TransactionStore.concat(s.transactions for s in source.parse_statements())
+        else:
+            source.parse_ing_bank_statement()
+            transactions = source.transactions
+        write_plain_csv(args, transactions, args.output, profiler)
+        return
+
+    df = amounts_in_cents(source.dataframe) if args.cents else source.dataframe
+    statements = source.statements if isinstance(source, IngStatementsFolder) else [source]
+    write_dataframe_output(args, df, statements, args.output, profiler)
+
+
+def write_plain_csv(args, transactions: TransactionStore, out_file: Union[str, Path],
+                    profiler: Optional[Profiler]) -> bool:
+    """ Write the default CSV output with the csv module, False if the output options require pandas """
+    if not is_plain_csv(out_file, args.format, args.partition, args.compression):
+        return False
+    with profile_stage(profiler, "write_csv"):
+        write_transactions_csv(out_file, newest_first(transactions), args.cents)
+    return True
+
+
+def write_dataframe_output(args, df: pd.DataFrame, statements: List[BankStatement], out_file: Union[str, Path],
+                           profiler: Optional[Profiler]):
+    partition_cols = None
+    if args.partition:
+        df = add_statement_year(df, statements)
+        partition_cols = ["statement_year"]
+
+    with profile_stage(profiler, f"write_{args.format}"):
+        df = df.sort_values("date", ascending=False, kind="stable")
+        write_dataframe(df, out_file, args.format, partition_cols, args.compression,
+                        **(CSV_OPTIONS if args.format == "csv" else {}))
+
+
+def account_output(output: Union[str, Path], account: str) -> Path:
+    output = Path(output)
+    return output.with_name(f"{output.stem}_{account}{output.suffix}")
 
 
 if __name__ == "__main__":
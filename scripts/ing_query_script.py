@@ -0,0 +1,62 @@
+import argparse
+from sys import stderr
+from typing import Optional, List
+
+import pandas as pd
+
+from ing_parser.store import TransactionDatabase, DEFAULT_DB_FILE
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="ingparser query",
+                                     description="Query transactions stored with ingparser --db")
+
+    parser.add_argument(
+        "--db",
+        type=str,
+        required=False,
+        default=DEFAULT_DB_FILE,
+        help=f"Transaction database (Default: {DEFAULT_DB_FILE})",
+    )
+    parser.add_argument("--account", type=str, required=False, default=None, help="IBAN of the account")
+    parser.add_argument("-t", "--type", type=str, required=False, default=None,
+                        help="Transaction type e.g. Lastschrift")
+    parser.add_argument("--issuer", type=str, required=False, default=None, help="Exact issuer name")
+    parser.add_argument("-y", "--year", type=int, required=False, default=None, help="Booking year")
+    parser.add_argument("--from", dest="date_from", type=str, required=False, default=None,
+                        help="First booking date YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", type=str, required=False, default=None,
+                        help="Last booking date YYYY-MM-DD")
+    parser.add_argument("-s", "--search", type=str, required=False, default=None,
+                        help="Case-insensitive text in issuer or description")
+    parser.add_argument("-n", "--limit", type=int, required=False, default=None, help="Maximum number of rows")
+    parser.add_argument("--cents", action="store_true", help="Show amounts as exact integer cents")
+    parser.add_argument(
+        "--balances",
+        action="store_true",
+        help="List statements with their old and new balance instead of transactions",
+    )
+    parser.add_argument("-o", "--output", type=str, required=False, default=None,
+                        help="Write the result as CSV instead of printing it")
+    args = parser.parse_args(argv)
+
+    db = TransactionDatabase(args.db)
+    if args.balances:
+        df = pd.DataFrame([(s.account_id, s.statement_year, s.statement_number, s.statement_date[:10],
+                            s.statement_old_balance, s.statement_balance)
+                           for s in db.statements(args.account, args.year)],
+                          columns=["account_id", "year", "number", "date", "old_balance", "balance"])
+    else:
+        df = db.dataframe(args.cents, account_id=args.account, type=args.type, issuer=args.issuer, year=args.year,
+                          date_from=args.date_from, date_to=args.date_to, search=args.search, limit=args.limit)
+
+    if args.output:
+        df.to_csv(args.output, index=False, sep=";", quoting=1)
+    elif df.empty:
+        print("No matching rows", file=stderr)
+    else:
+        print(df.to_string(index=False, max_colwidth=60))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import asyncio
+import concurrent.futures
+import os
+from functools import partial
+from pathlib import Path
+from typing import Union, Optional, AsyncIterator, Tuple
+
+from ing_parser.cache import StatementCache
+from ing_parser.data import BankStatement
+from ing_parser.folder import EXECUTORS, IngStatementsFolder, parse_statement_file
+from ing_parser.source import PdfSource, is_path
+
+
+class AsyncStatementParser:
+    def __init__(self, max_workers: Optional[int] = None, executor: str = "process",
+                 max_pending: Optional[int] = None, timeout: Optional[float] = None,
+                 cache: Optional[StatementCache] = None, skip_info_pages: bool = True):
+        """
+        Parses statements for asyncio applications without blocking the event loop.
+
+        Text extraction runs in a bounded worker pool, 'process' by default as it is CPU-bound.
+        At most max_pending statements, two per worker by default, are submitted to the pool at once.
+        Further requests wait for a free slot, so a burst of uploads queues up in the event loop
+        instead of piling up inside the pool. timeout is the default time limit per statement in
+        seconds, including the wait for a slot.
+
+        A request that is cancelled or times out before its statement was picked up by a worker is
+        removed from the pool. A statement already being parsed finishes in the background and keeps its
+        slot until then, so the pool is never oversubscribed.
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor {executor}, expected one of {', '.join(EXECUTORS)}")
+
+        if executor == "process":
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.executor = executor
+        self.max_pending = max_pending or 2 * (max_workers or os.cpu_count() or 1)
+        self.timeout = timeout
+        self.pending = 0
+        self._worker = partial(parse_statement_file, cache=cache, skip_info_pages=skip_info_pages)
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> 'AsyncStatementParser':
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """ Shut down the worker pool, statements that did not start yet are cancelled """
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def parse_statement(self, source: PdfSource, timeout: Optional[float] = None) -> BankStatement:
+        """ Parse a PDF file or PDF content, raises TimeoutError after timeout seconds """
+        return await asyncio.wait_for(self._parse(source), self.timeout if timeout is None else timeout)
+
+    async def _parse(self, source: PdfSource) -> BankStatement:
+        if is_path(source):
+            source = Path(source)
+        elif self.executor == "process" and not isinstance(source, bytes):
+            # -- Worker processes receive a pickled copy, which requires bytes. Files are read in a thread
+            source = await asyncio.to_thread(source.read) if hasattr(source, "read") else bytes(source)
+        return await self._submit(source)
+
+    async def iter_folder(self, source_directory: Union[str, Path], account_type: str = "Giro",
+                          recursive: bool = False) -> AsyncIterator[Tuple[Path, BankStatement]]:
+        """ Yield (file, statement) pairs of a directory in the order they finish parsing.
+
+            The timeout applies per file. Files are submitted as slots become free, leaving the iterator
+            early cancels all remaining files.
+        """
+        # -- Listing a large directory tree must not block the event loop either
+        files = await asyncio.to_thread(IngStatementsFolder(source_directory, account_type,
+                                                            recursive=recursive).find_files)
+
+        async def parse(file: Path) -> Tuple[Path, BankStatement]:
+            return file, await self.parse_statement(file)
+
+        tasks = [asyncio.ensure_future(parse(file)) for file in files]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # -- Created on first use so it binds to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        return self._slots
+
+    async def _submit(self, source: PdfSource) -> BankStatement:
+        slots = self._semaphore()
+        await slots.acquire()
+        try:
+            future = self._pool.submit(self._worker, source)
+        except BaseException:
+            slots.release()
+            raise
+
+        # -- Free the slot once the worker is done, not when the awaiting request gives up
+        self.pending += 1
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda _: _call_soon(loop, self._release))
+        return await asyncio.wrap_future(future)
+
+    def _release(self):
+        self.pending -= 1
+        self._slots.release()
+
+
+def _call_soon(loop: asyncio.AbstractEventLoop, callback):
+    try:
+        loop.call_soon_threadsafe(callback)
+    except RuntimeError:
+        # -- Event loop already closed, nobody is waiting for the slot anymore
+        pass
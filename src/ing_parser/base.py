@@ -1,7 +1,14 @@
 import re
+from typing import Optional, Set, Tuple
 
 from ing_parser.data import BankStatement
 
+# -- Bump whenever parsing results change, invalidates cached statements
+# -- 3: descriptions end at page breaks and the closing balance
+# -- 4: statement month and year are parsed without the system locale, e.g. März
+# -- 5: balances missing from the statement header are None instead of 0.0
+PARSER_VERSION = 5
+
 
 class IngBase:
     # Not in use
@@ -10,13 +17,64 @@ class IngBase:
     "retoure")
 
     _SEARCH_TERM = "kontoauszug"
+    # -- Closing balance, following pages contain no bookings
+    _END_OF_BOOKINGS = "Neuer Saldo"
     _MAX_DESC_LINES = 3
     _DATE_REGEX = re.compile(r"^(0[1-9]|[12]\d|3[01])[.](0[1-9]|1[012])[.](19|20)(\d{2})")
     _AMOUNT_REGEX = re.compile(r"(-?(\d{1,3}(\.\d{3})*|\d+),\d{2})$")
 
+    # -- Date at the start of the line, optionally followed by text and an amount at the end of a transaction line
+    _LINE_REGEX = re.compile(r"^(?P<date>(?:0[1-9]|[12]\d|3[01])[.](?:0[1-9]|1[012])[.](?:19|20)\d{2})"
+                             r"(?:(?P<text>.*?)(?P<amount>-?(?:\d{1,3}(?:\.\d{3})*|\d+),\d{2})$)?")
+
+    # -- Line kinds
+    _LINE_TEXT = 0
+    _LINE_DATE = 1
+    _LINE_TRANSACTION = 2
+
+    # -- First word of header lines and the BankStatement fields they contain
+    _HEADER_TOKENS = {
+        "Kontoauszug": ("statement_month", "statement_year"),
+        "Datum": ("statement_date",),
+        "Auszugsnummer": ("statement_number",),
+        "Neuer": ("statement_balance",),
+        "Alter": ("statement_old_balance",),
+        "IBAN": ("account_id",),
+        "BIC": ("bank_id",),
+    }
+
     @staticmethod
     def _parse_statement_fields(line: str, statement: 'BankStatement'):
         for field_name, regex in statement.get_regex_fields().items():
-            m = re.match(regex, line)
+            m = regex.match(line)
             if m:
                 statement.set_field_from_regex(field_name, m)
+
+    @classmethod
+    def _parse_header_line(cls, line: str, statement: 'BankStatement', missing_fields: Set[str]) -> bool:
+        """ Parse header fields still missing from the statement, dispatched by the first word of the line """
+        field_names = cls._HEADER_TOKENS.get(line.partition(" ")[0])
+        if field_names is None or missing_fields.isdisjoint(field_names):
+            return False
+
+        m = statement.get_regex_fields()[field_names[0]].match(line)
+        if m is None:
+            return False
+
+        for field_name in field_names:
+            statement.set_field_from_regex(field_name, m)
+            missing_fields.discard(field_name)
+        return True
+
+    @classmethod
+    def _classify_line(cls, line: str) -> Tuple[int, Optional[re.Match]]:
+        """ Classify a line in one pass as transaction, dated (Valuta/description) or plain text line """
+        if not line[:1].isdigit():
+            return cls._LINE_TEXT, None
+
+        m = cls._LINE_REGEX.match(line)
+        if m is None:
+            return cls._LINE_TEXT, None
+        if m.group("amount") is None:
+            return cls._LINE_DATE, m
+        return cls._LINE_TRANSACTION, m
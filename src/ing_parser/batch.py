@@ -0,0 +1,275 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from ing_parser.cache import StatementCache
+from ing_parser.data import BankStatement
+from ing_parser.profiling import Profiler
+from ing_parser.statement import IngStatement
+
+# -- Stage of a file before the first and between parser stages, e.g. while lines are classified
+START_STAGE = "start"
+PARSE_STAGE = "parse"
+TIMEOUT_ERROR = "TimeoutError"
+WORKER_EXIT_ERROR = "WorkerExit"
+
+_STAGE, _RESULT, _ERROR = "stage", "result", "error"
+
+
+@dataclass
+class FileLimits:
+    """ Limits per statement file, None for no limit.
+
+        timeout is the wall time in seconds until the worker of a file is killed. memory is the number of bytes
+        a worker may allocate for a file on top of what it used before the file, enforced with an address space
+        rlimit where supported.
+    """
+    timeout: Optional[float] = None
+    memory: Optional[int] = None
+
+
+@dataclass
+class FileError:
+    file: str
+    stage: str
+    exception: str
+    message: str
+    elapsed: float
+
+
+@dataclass
+class ErrorReport:
+    files: int = 0
+    errors: List[FileError] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return f"Parsed {self.files - len(self.errors)}/{self.files} files, {len(self.errors)} failed"
+
+    def write_json(self, out_file: Union[str, Path]):
+        with open(out_file, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, indent=2)
+
+
+class _StageReporter(Profiler):
+    """ Profiler of a worker process, which sends every stage it enters to the parent """
+
+    def __init__(self, connection: Connection):
+        super().__init__()
+        self.connection = connection
+        self.current = START_STAGE
+
+    def _report(self, stage: str):
+        self.current = stage
+        self.connection.send((_STAGE, stage))
+
+    @contextmanager
+    def stage(self, stage: str, file: Union[str, Path, None] = None, **args) -> Iterator[None]:
+        self._report(stage)
+        with super().stage(stage, file, **args):
+            yield
+        # -- Not reached on errors, the failing stage is kept
+        self._report(PARSE_STAGE)
+
+
+def _limit_memory(memory: int) -> bool:
+    """ Limit the address space to memory bytes more than currently used, False if not supported """
+    try:
+        import resource
+    except ImportError:
+        logging.warning("Memory limits are not supported on this platform")
+        return False
+
+    used = 0
+    try:
+        with open("/proc/self/statm", "r") as f:
+            used = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (used + memory, resource.RLIM_INFINITY))
+    except (ValueError, OSError) as e:
+        logging.warning(f"Memory limits are not supported on this platform: {e}")
+        return False
+    return True
+
+
+def _parse_worker(connection: Connection, cache: Optional[StatementCache], skip_info_pages: bool,
+                  memory: Optional[int], profile: bool):
+    """ Entry point of a worker process. Parses files received from the parent until None, and sends the stages
+        and then the statement or the error of every file. Exits after an error, as its state may be damaged.
+    """
+    with connection:
+        while (file_path := connection.recv()) is not None:
+            start = time.perf_counter()
+            # -- Taken per file, so memory kept by earlier files does not count against the next one
+            if memory and not _limit_memory(memory):
+                memory = None
+            reporter = _StageReporter(connection)
+            try:
+                statement = IngStatement(file_path, cache, skip_info_pages, reporter, strict=True)
+                statement.parse_ing_bank_statement()
+                connection.send((_RESULT, statement.to_bank_statement(),
+                                 reporter.file(file_path) if profile else None))
+            except BaseException as e:
+                connection.send((_ERROR, reporter.current, type(e).__name__, str(e), time.perf_counter() - start))
+                return
+
+
+@dataclass
+class _Worker:
+    process: multiprocessing.Process
+    connection: Connection
+    index: Optional[int] = None
+    file: Optional[Path] = None
+    start: float = 0.0
+    stage: str = START_STAGE
+
+
+class IsolatedParser:
+    def __init__(self, limits: Optional[FileLimits] = None, max_workers: Optional[int] = None,
+                 cache: Optional[StatementCache] = None, skip_info_pages: bool = True,
+                 profiler: Optional[Profiler] = None, report: Optional[ErrorReport] = None):
+        """
+        Fault-isolated batch parsing, files are parsed in separate worker processes.
+
+        A file that raises, exceeds its FileLimits or crashes its worker is recorded in report with the stage
+        it failed in, e.g. open or extract_text, and the batch continues with the next file. Workers that run
+        into the timeout are killed, so a single pathological PDF cannot stall the batch. A worker parses
+        file after file and is only replaced after a failure, which keeps the cost of isolation close to
+        a process pool.
+        """
+        self.limits = limits or FileLimits()
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache = cache
+        self.skip_info_pages = skip_info_pages
+        self.profiler = profiler
+        self.report = report or ErrorReport()
+
+    def parse(self, pdf_files: Iterable[Path]) -> List[Optional[BankStatement]]:
+        """ Statements in the order of pdf_files, None for files that failed """
+        return [statement for _, statement in self.iter_parse(pdf_files)]
+
+    def iter_parse(self, pdf_files: Iterable[Path],
+                   window: Optional[int] = None) -> Iterator[Tuple[Path, Optional[BankStatement]]]:
+        """ Yield every file with its statement, None if it failed, in the order of pdf_files.
+            At most window files, two per worker by default, are running or waiting for a slower predecessor.
+        """
+        # -- Forked workers inherit the module instead of importing it on their own
+        import pypdf  # noqa: F401
+
+        pdf_files = list(pdf_files)
+        window = max(window or 2 * self.max_workers, self.max_workers)
+        workers: List[_Worker] = list()
+        done: Dict[int, Optional[BankStatement]] = dict()
+        submitted = next_index = 0
+
+        try:
+            while next_index < len(pdf_files):
+                idle = [w for w in workers if w.file is None]
+                while submitted < len(pdf_files) and submitted - next_index < window \
+                        and (idle or len(workers) < self.max_workers):
+                    worker = idle.pop() if idle else self._start_worker(workers)
+                    self._assign(worker, submitted, pdf_files[submitted])
+                    submitted += 1
+
+                if next_index in done:
+                    yield pdf_files[next_index], done.pop(next_index)
+                    next_index += 1
+                    continue
+
+                busy = [w for w in workers if w.file is not None]
+                wait([w.connection for w in busy], self._wait_timeout(busy))
+                # -- Receive all messages first, files that finished while the consumer was busy are no timeouts
+                self._drain(workers, done)
+                self._kill_timed_out(workers, done)
+        finally:
+            for worker in workers:
+                self._stop(worker)
+
+    def _start_worker(self, workers: List[_Worker]) -> _Worker:
+        connection, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_parse_worker, args=(child, self.cache, self.skip_info_pages,
+                                                                      self.limits.memory, bool(self.profiler)),
+                                          daemon=True)
+        process.start()
+        # -- Only the worker may hold its end, so its exit is seen as end of file
+        child.close()
+        worker = _Worker(process, connection)
+        workers.append(worker)
+        return worker
+
+    def _assign(self, worker: _Worker, index: int, file: Path):
+        self.report.files += 1
+        worker.index, worker.file, worker.start, worker.stage = index, file, time.perf_counter(), START_STAGE
+        worker.connection.send(file)
+
+    def _wait_timeout(self, busy: Iterable[_Worker]) -> Optional[float]:
+        if self.limits.timeout is None:
+            return None
+        now = time.perf_counter()
+        return max(0.0, min(worker.start + self.limits.timeout - now for worker in busy))
+
+    def _drain(self, workers: List[_Worker], done: Dict[int, Optional[BankStatement]]):
+        for worker in [w for w in workers if w.file is not None]:
+            while worker in workers and worker.file is not None and worker.connection.poll():
+                self._receive(workers, worker, done)
+
+    def _receive(self, workers: List[_Worker], worker: _Worker, done: Dict[int, Optional[BankStatement]]):
+        try:
+            message = worker.connection.recv()
+        except (EOFError, OSError):
+            worker.process.join()
+            self._fail(workers, worker, done, WORKER_EXIT_ERROR, f"Worker exited with code {worker.process.exitcode}")
+            return
+
+        if message[0] == _STAGE:
+            worker.stage = message[1]
+        elif message[0] == _RESULT:
+            _, statement, profile = message
+            if profile is not None:
+                self.profiler.add_file(profile)
+            done[worker.index] = statement
+            worker.index = worker.file = None
+        else:
+            _, worker.stage, exception, text, elapsed = message
+            self._fail(workers, worker, done, exception, text, elapsed)
+
+    def _kill_timed_out(self, workers: List[_Worker], done: Dict[int, Optional[BankStatement]]):
+        if self.limits.timeout is None:
+            return
+        now = time.perf_counter()
+        for worker in [w for w in workers if w.file is not None and now - w.start >= self.limits.timeout]:
+            self._fail(workers, worker, done, TIMEOUT_ERROR, f"No result after {self.limits.timeout}s")
+
+    def _fail(self, workers: List[_Worker], worker: _Worker, done: Dict[int, Optional[BankStatement]],
+              exception: str, message: str, elapsed: Optional[float] = None):
+        """ Report the file of a worker and replace the worker, it is killed if still running.
+            elapsed is measured by the worker for errors it reports, otherwise the time since the file was assigned.
+        """
+        elapsed = time.perf_counter() - worker.start if elapsed is None else elapsed
+        error = FileError(str(worker.file), worker.stage, exception, message, elapsed)
+        logging.error(f"Failed to parse {worker.file} in stage {error.stage} after {error.elapsed:.1f}s: "
+                      f"{exception} {message}")
+        self.report.errors.append(error)
+        done[worker.index] = None
+        workers.remove(worker)
+        self._stop(worker)
+
+    @staticmethod
+    def _stop(worker: _Worker):
+        if worker.file is None:
+            try:
+                worker.connection.send(None)
+            except OSError:
+                pass
+        else:
+            worker.process.kill()
+        worker.connection.close()
+        worker.process.join()
@@ -0,0 +1,134 @@
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+import pandas as pd
+import pypdf
+
+from ing_parser.batch import FileLimits
+from ing_parser.categorize import Categorizer, CategoryRule
+from ing_parser.data import TransactionStore
+from ing_parser.folder import IngStatementsFolder
+from ing_parser.io import ez, yaffa
+from ing_parser.io.writer import write_transactions_csv, newest_first
+from ing_parser.statement import IngStatement, transactions_to_dataframe
+from ing_parser.synthetic import generate_folder
+
+# -- Bump whenever a stage measures something else, results of different versions are not comparable
+BENCHMARK_VERSION = 2
+
+# -- Rules covering the issuers of ing_parser.synthetic with every kind of condition
+BENCHMARK_RULES = [
+    CategoryRule("Groceries", "Food", keywords=["rewe", "edeka", "bäckerei"], max_amount=0),
+    CategoryRule("Utilities", "Electricity", issuer="^stadtwerke"),
+    CategoryRule("Utilities", "Internet/Cable", keywords=["telekom", "vodafone"]),
+    CategoryRule("Housing", "Rent", issuer="hausverwaltung", description=r"miete|verwendungszweck \d+"),
+    CategoryRule("Salary", "Main Job", type="Gehalt/Rente", min_amount=0),
+    CategoryRule("Miscellaneous", "Fines", type="Entgelt"),
+]
+
+
+def time_stage(func: Callable, repeat: int) -> Dict[str, Union[float, List[float]]]:
+    runs = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return {"min": min(runs), "median": statistics.median(runs), "mean": statistics.fmean(runs), "runs": runs}
+
+
+def run_cli(*args: str):
+    """ Run ingparser in a fresh interpreter, so its import time is part of the measurement """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    subprocess.run([sys.executable, "-m", "scripts.ing_parse_script", *args], env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run_benchmarks(statements: int = 24, transactions: int = 40, transactions_per_page: int = 25, repeat: int = 3,
+                   work_dir: Optional[Union[str, Path]] = None, stages: Optional[List[str]] = None) -> dict:
+    """ Generate a synthetic statement folder and time every parser stage separately.
+
+        Returns a JSON serializable dict with the environment, parameters and min/median/mean seconds per stage.
+    """
+    with tempfile.TemporaryDirectory(prefix="ing_bench_") as tmp_dir:
+        directory = Path(work_dir or tmp_dir)
+        generate_folder(directory, statements, transactions, transactions_per_page)
+        pdf_files = IngStatementsFolder(directory).find_files()
+
+        # -- Inputs for stages that are timed in isolation
+        lines = {file: IngStatement(file)._read_pdf() for file in pdf_files}
+        folder = IngStatementsFolder(directory)
+        df = folder.dataframe
+        all_transactions = [t for s in folder.statements for t in s.transactions]
+        store = TransactionStore.concat(s.transactions for s in folder.statements)
+        out_file = directory / "benchmark_output.csv"
+        # -- A single cached file is the typical short run of a cron job
+        single_file = ["--cache-dir", str(directory / "cache"), "-o", str(out_file), str(pdf_files[0])]
+        if not stages or "startup_single_file" in stages:
+            run_cli(*single_file)
+
+        benchmarks = {
+            "read_pdf": lambda: [IngStatement(f)._read_pdf() for f in pdf_files],
+            "parse_lines": lambda: [list(IngStatement(f)._parse_lines(lines[f])) for f in pdf_files],
+            "dataframe": lambda: transactions_to_dataframe(all_transactions),
+            "folder_thread": lambda: IngStatementsFolder(directory, executor="thread").parse(),
+            "folder_process": lambda: IngStatementsFolder(directory, executor="process").parse(),
+            "folder_stream": lambda: list(IngStatementsFolder(directory, executor="process").iter_parsed_statements()),
+            "folder_isolated": lambda: IngStatementsFolder(directory, limits=FileLimits()).parse(),
+            "csv_pandas": lambda: df.sort_values("date", ascending=False).to_csv(out_file, index=False, sep=";",
+                                                                                 quoting=1),
+            "csv_stream": lambda: write_transactions_csv(out_file, all_transactions),
+            "csv_plain": lambda: write_transactions_csv(out_file, newest_first(all_transactions)),
+            "categorize": lambda: Categorizer(BENCHMARK_RULES, "system3").categorize(store),
+            "ez_dataframe": lambda: ez.convert_to_ez_dataframe(folder.statements),
+            "ez_csv": lambda: ez.write_ez_csv(out_file, all_transactions),
+            "yaffa_dataframe": lambda: yaffa.yaffa_dataframe(folder.statements),
+            "yaffa_csv": lambda: yaffa.write_yaffa_csv(out_file, folder.statements),
+            "startup_help": lambda: run_cli("--help"),
+            "startup_single_file": lambda: run_cli(*single_file),
+        }
+
+        results = dict()
+        for name, func in benchmarks.items():
+            if stages and name not in stages:
+                continue
+            logging.info(f"Running benchmark {name}")
+            results[name] = time_stage(func, repeat)
+
+    return {
+        "benchmark_version": BENCHMARK_VERSION,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pypdf": pypdf.__version__,
+            "pandas": pd.__version__,
+        },
+        "parameters": {
+            "statements": statements,
+            "transactions_per_statement": transactions,
+            "transactions_per_page": transactions_per_page,
+            "repeat": repeat,
+        },
+        "counts": {
+            "files": len(pdf_files),
+            "lines": sum(len(v) for v in lines.values()),
+            "transactions": len(all_transactions),
+        },
+        "results": results,
+    }
+
+
+def format_results(report: dict) -> str:
+    rows = [f"{'stage':<18}{'min [s]':>12}{'median [s]':>12}{'per tx [us]':>14}"]
+    num_transactions = max(1, report["counts"]["transactions"])
+    for name, result in report["results"].items():
+        rows.append(f"{name:<18}{result['min']:>12.4f}{result['median']:>12.4f}"
+                    f"{result['min'] / num_transactions * 1e6:>14.2f}")
+    return "\n".join(rows)
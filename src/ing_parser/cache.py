@@ -0,0 +1,171 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import fields, astuple
+from pathlib import Path
+from typing import Union, Optional, List, Iterator, BinaryIO, Dict, Tuple
+
+from ing_parser.base import PARSER_VERSION
+from ing_parser.data import BankStatement, Transaction
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+def default_cache_dir() -> Path:
+    if os.name == "nt" and os.environ.get("LOCALAPPDATA"):
+        return Path(os.environ["LOCALAPPDATA"]) / "ing_parser" / "cache"
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "ing_parser"
+
+
+def file_hash(file_path: Union[str, Path]) -> str:
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def data_hash(data: Union[bytes, bytearray, memoryview, BinaryIO]) -> str:
+    """ Same hash as file_hash for in-memory content or an open binary file, which is rewound afterwards """
+    if not hasattr(data, "read"):
+        return hashlib.sha256(data).hexdigest()
+
+    h = hashlib.sha256()
+    position = data.tell()
+    data.seek(0)
+    for chunk in iter(lambda: data.read(1024 * 1024), b""):
+        h.update(chunk)
+    data.seek(position)
+    return h.hexdigest()
+
+
+class StatementCache:
+    _DB_NAME = "statements.sqlite"
+
+    def __init__(self, cache_dir: Union[str, Path, None] = None, max_size: int = DEFAULT_MAX_SIZE):
+        """
+        Content addressed on-disk cache for parsed statements.
+
+        Entries are keyed by the PDF content hash. Extracted lines are additionally keyed by the pypdf version,
+        parsed BankStatement records by the PARSER_VERSION. So a parser update re-parses from cached lines
+        without touching the PDF again. The least recently used entries are evicted once the cache grows
+        beyond max_size bytes.
+
+        Only the cache location is stored, so the cache can be handed to worker processes.
+        A cache that cannot be opened, e.g. a corrupt or read-only database, is disabled and statements are parsed.
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.max_size = max_size
+        self.disabled = False
+
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with self._connect() as con:
+                con.execute("PRAGMA journal_mode=WAL")
+                con.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, data BLOB NOT NULL, "
+                            "size INTEGER NOT NULL, last_access REAL NOT NULL)")
+                con.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Error opening statement cache {self.db_file}, parsing without cache: {e}")
+            self.disabled = True
+
+    @property
+    def db_file(self) -> Path:
+        return self.cache_dir / self._DB_NAME
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(self.db_file, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    @staticmethod
+    def _lines_key(content_hash: str, variant: str) -> str:
+        # -- Only needed once text has to be extracted, which loads pypdf anyway
+        from pypdf import __version__ as pypdf_version
+        return f"lines:{content_hash}:{pypdf_version}:{variant}"
+
+    @staticmethod
+    def _statement_key(content_hash: str, variant: str) -> str:
+        return f"statement:{content_hash}:{PARSER_VERSION}:{variant}"
+
+    def _get(self, key: str) -> Optional[object]:
+        if self.disabled:
+            return None
+        try:
+            with self._connect() as con:
+                row = con.execute("SELECT data FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                con.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            return json.loads(zlib.decompress(row[0]))
+        except (sqlite3.Error, zlib.error, ValueError) as e:
+            logging.error(f"Error reading statement cache {self.db_file}: {e}")
+            return None
+
+    def _put(self, key: str, value: object):
+        """ Store a JSON serialisable value, failures are logged and never abort the parse """
+        if self.disabled:
+            return
+        try:
+            data = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+            with self._connect() as con:
+                con.execute("INSERT OR REPLACE INTO entries (key, data, size, last_access) VALUES (?, ?, ?, ?)",
+                            (key, data, len(data), time.time()))
+                self._evict(con)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logging.error(f"Error writing statement cache {self.db_file}, not caching {key}: {e}")
+
+    def _evict(self, con: sqlite3.Connection):
+        size = con.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if size <= self.max_size:
+            return
+
+        for key, entry_size in con.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            con.execute("DELETE FROM entries WHERE key = ?", (key,))
+            size -= entry_size
+            if size <= self.max_size:
+                break
+
+    def get_lines(self, content_hash: str, variant: str = str()) -> Optional[List[str]]:
+        """ Cached text lines, variant separates different extraction modes of the same file """
+        return self._get(self._lines_key(content_hash, variant))
+
+    def put_lines(self, content_hash: str, lines: List[str], variant: str = str()):
+        self._put(self._lines_key(content_hash, variant), lines)
+
+    def get_statement(self, content_hash: str, variant: str = str()) -> Optional[BankStatement]:
+        cached = self.get_statement_counts(content_hash, variant)
+        return cached[0] if cached else None
+
+    def get_statement_counts(self, content_hash: str,
+                             variant: str = str()) -> Optional[Tuple[BankStatement, Dict[str, int]]]:
+        """ Cached statement with the page and line counts it was parsed from, see put_statement """
+        record = self._get(self._statement_key(content_hash, variant))
+        if record is None:
+            return None
+
+        statement = BankStatement(**record["header"])
+        for values in record["transactions"]:
+            statement.add_transaction(Transaction(*values))
+        return statement, record.get("counts", dict())
+
+    def put_statement(self, content_hash: str, statement: BankStatement, variant: str = str(),
+                      counts: Optional[Dict[str, int]] = None):
+        """ counts are optional statistics like pages and lines, restored for profiling """
+        header = {f.name: getattr(statement, f.name) for f in fields(BankStatement) if f.name != "transactions"}
+        record = {"header": header, "transactions": [astuple(t) for t in statement.transactions],
+                  "counts": counts or dict()}
+        self._put(self._statement_key(content_hash, variant), record)
+
+    def clear(self):
+        with self._connect() as con:
+            con.execute("DELETE FROM entries")
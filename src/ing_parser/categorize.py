@@ -0,0 +1,215 @@
+import json
+import re
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import List, Optional, Iterable, Dict, Union, Tuple
+
+from ing_parser.data import Transaction, TransactionStore
+from ing_parser.io.yaffa_categories import System1, System2, System3
+
+CATEGORY_SYSTEMS = {"system1": System1, "system2": System2, "system3": System3}
+
+
+@dataclass
+class CategoryRule:
+    """ Assigns category and sub_category to transactions matching all given conditions.
+
+        issuer and description are case-insensitive regular expressions searched in the respective field.
+        keywords match case-insensitively anywhere in issuer or description, one of them has to be found.
+        type is the exact ING transaction type, min_amount and max_amount are inclusive bounds in euros,
+        negative for expenses.
+    """
+    category: str
+    sub_category: str = str()
+    issuer: Optional[str] = None
+    description: Optional[str] = None
+    keywords: List[str] = field(default_factory=list)
+    type: Optional[str] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        """ Category and sub category as one hierarchical name, e.g. Housing:Rent """
+        return f"{self.category}:{self.sub_category}" if self.sub_category else self.category
+
+
+def load_rules(rules_file: Union[str, Path]) -> List[CategoryRule]:
+    """ Read rules from a JSON list of objects with the fields of CategoryRule """
+    with open(rules_file, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+
+    known = {f.name for f in fields(CategoryRule)}
+    rules = list()
+    for idx, entry in enumerate(entries):
+        unknown = set(entry) - known
+        if unknown:
+            raise ValueError(f"Rule {idx} in {rules_file} has unknown fields {', '.join(sorted(unknown))}")
+        rules.append(CategoryRule(**entry))
+    return rules
+
+
+def system_categories(system: str) -> Dict[str, List[str]]:
+    """ Categories of a category system with their sub categories, income and expense combined """
+    if system not in CATEGORY_SYSTEMS:
+        raise ValueError(f"Unknown category system {system}, expected one of {', '.join(CATEGORY_SYSTEMS)}")
+
+    categories = dict()
+    tree = CATEGORY_SYSTEMS[system]()
+    for group in (tree.income_categories, tree.expense_categories):
+        for category in group:
+            categories[category] = list(group[category]) if isinstance(group, dict) else list()
+    return categories
+
+
+class Categorizer:
+    def __init__(self, rules: Iterable[CategoryRule], system: Optional[str] = None):
+        """
+        Compiles category rules into one combined matcher, the first matching rule wins.
+
+        Conditions of all rules are evaluated together as bit masks with one bit per rule:
+        description regexes are combined into a single pattern of optional lookaheads, which reports every
+        matching rule in one match call. Keywords are compiled into one trie shaped regex, which finds all
+        keywords of a text in one scan. Issuer regexes and issuer keywords are only evaluated once per unique
+        issuer, type conditions once per unique type, only amount ranges are checked per transaction.
+
+        With a system of CATEGORY_SYSTEMS, every rule has to name one of its categories and sub categories.
+        Patterns are combined, so they must not use numbered back references.
+        """
+        self.rules = list(rules)
+        if system:
+            self._validate(system)
+
+        self._all = (1 << len(self.rules)) - 1
+        self._issuer_patterns = [(1 << idx, re.compile(r.issuer, re.IGNORECASE))
+                                 for idx, r in enumerate(self.rules) if r.issuer]
+        self._no_issuer = self._mask(not r.issuer for r in self.rules)
+        self._no_description = self._mask(not r.description for r in self.rules)
+        self._no_keywords = self._mask(not any(r.keywords) for r in self.rules)
+        self._amounts = [(round(r.min_amount * 100) if r.min_amount is not None else None,
+                          round(r.max_amount * 100) if r.max_amount is not None else None) for r in self.rules]
+
+        self._descriptions = self._compile_descriptions()
+        self._keywords, self._keyword_masks = self._compile_keywords()
+        self._issuer_cache: Dict[str, int] = dict()
+        self._type_cache: Dict[str, int] = dict()
+
+    @classmethod
+    def from_file(cls, rules_file: Union[str, Path], system: Optional[str] = None) -> 'Categorizer':
+        return cls(load_rules(rules_file), system)
+
+    def _validate(self, system: str):
+        categories = system_categories(system)
+        for rule in self.rules:
+            if rule.category not in categories:
+                raise ValueError(f"Category {rule.category} is not part of {system}")
+            if rule.sub_category and rule.sub_category not in categories[rule.category]:
+                raise ValueError(f"Sub category {rule.sub_category} is not part of {system} {rule.category}")
+
+    @staticmethod
+    def _mask(flags: Iterable[bool]) -> int:
+        return sum(1 << idx for idx, flag in enumerate(flags) if flag)
+
+    def _compile_descriptions(self) -> Optional[re.Pattern]:
+        lookaheads = [f"(?=.*?(?P<r{idx}>{r.description}))?" for idx, r in enumerate(self.rules) if r.description]
+        return re.compile("".join(lookaheads), re.IGNORECASE | re.DOTALL) if lookaheads else None
+
+    def _compile_keywords(self) -> Tuple[Optional[re.Pattern], Dict[str, int]]:
+        masks = dict()
+        for idx, rule in enumerate(self.rules):
+            for keyword in filter(None, (k.casefold() for k in rule.keywords)):
+                masks[keyword] = masks.get(keyword, 0) | (1 << idx)
+        if not masks:
+            return None, masks
+
+        # -- The trie regex matches the longest keyword at a position, which also contains all its prefixes
+        prefix_masks = dict()
+        for keyword in masks:
+            prefix_masks[keyword] = 0
+            for end in range(1, len(keyword) + 1):
+                prefix_masks[keyword] |= masks.get(keyword[:end], 0)
+        # -- Lookahead to find overlapping keywords at every position
+        return re.compile(f"(?=({_trie_pattern(masks)}))"), prefix_masks
+
+    def _keyword_mask(self, text: str) -> int:
+        if self._keywords is None:
+            return 0
+        mask = 0
+        for match in self._keywords.finditer(text.casefold()):
+            mask |= self._keyword_masks[match.group(1)]
+        return mask
+
+    def _issuer_mask(self, issuer: str) -> int:
+        """ Rules whose issuer condition matches, plus the issuer part of the keyword mask """
+        mask = self._issuer_cache.get(issuer)
+        if mask is None:
+            mask = self._no_issuer
+            for bit, pattern in self._issuer_patterns:
+                if pattern.search(issuer):
+                    mask |= bit
+            # -- The keyword bits of an issuer are kept above the rule bits
+            mask |= self._keyword_mask(issuer) << len(self.rules)
+            self._issuer_cache[issuer] = mask
+        return mask
+
+    def _type_mask(self, transaction_type: str) -> int:
+        mask = self._type_cache.get(transaction_type)
+        if mask is None:
+            mask = self._mask(not r.type or r.type == transaction_type for r in self.rules)
+            self._type_cache[transaction_type] = mask
+        return mask
+
+    def match(self, issuer: str, description: str, transaction_type: str, cents: int) -> Optional[CategoryRule]:
+        """ First rule matching a transaction, None if no rule matches """
+        issuer_mask = self._issuer_mask(issuer)
+        mask = issuer_mask & self._type_mask(transaction_type) & self._all
+        if not mask:
+            return None
+
+        if self._descriptions is not None and mask & ~self._no_description:
+            groups = self._descriptions.match(description).groupdict()
+            mask &= self._no_description | sum(1 << int(name[1:]) for name, value in groups.items()
+                                               if value is not None)
+        if self._keywords is not None and mask & ~self._no_keywords:
+            keywords = (issuer_mask >> len(self.rules)) | self._keyword_mask(description)
+            mask &= self._no_keywords | keywords
+
+        while mask:
+            idx = (mask & -mask).bit_length() - 1
+            low, high = self._amounts[idx]
+            if (low is None or cents >= low) and (high is None or cents <= high):
+                return self.rules[idx]
+            mask &= mask - 1
+        return None
+
+    def match_transaction(self, transaction: Transaction) -> Optional[CategoryRule]:
+        return self.match(transaction.issuer, transaction.description, transaction.type, transaction.cents)
+
+    def categorize(self, transactions: Iterable[Transaction]) -> List[Optional[CategoryRule]]:
+        """ Matching rule per transaction, e.g. of TransactionStore.concat over a whole folder.
+            A TransactionStore is matched from its columns without creating Transaction objects.
+        """
+        if not isinstance(transactions, TransactionStore):
+            transactions = TransactionStore(transactions)
+        columns = transactions.columns()
+        return [self.match(*values) for values in zip(columns["issuer"], columns["description"], columns["type"],
+                                                      columns["cents"])]
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    trie = dict()
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, dict())
+        node[""] = dict()
+    return _node_pattern(trie)
+
+
+def _node_pattern(node: dict) -> str:
+    branches = [re.escape(char) + _node_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return str()
+    pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    # -- Greedy, so the longest keyword is matched
+    return f"(?:{pattern})?" if "" in node else pattern
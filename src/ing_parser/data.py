@@ -1,40 +1,41 @@
-import locale
-import logging
 import re
+import sys
+from array import array
+from collections.abc import Sequence
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Optional
+from typing import Optional, Iterator, Iterable, Dict, List, Union
 
-try:
-    # Try to set locale to german for parsing german date description
-    locale.setlocale(locale.LC_TIME, 'de_DE.UTF-8')
-except Exception as e:
-    logging.error(e)
-
-
-def to_iso_date(date: str) -> str:
-    return datetime.strptime(date, "%d.%m.%Y").isoformat()
+from ing_parser.dates import to_iso_date, parse_date, parse_month
 
 
 def parse_statement_month(v: Optional[re.Match]) -> Optional[datetime]:
     if len(v.groups()) != 2:
         return None
-    return datetime.strptime(f"{v.group(1)} {v.group(2)}", "%B %Y") if v else None
+    return parse_month(v.group(1), v.group(2)) if v else None
 
 
 def parse_statement_date(v: Optional[re.Match]) -> Optional[datetime]:
     if len(v.group(1)) != 10:
         return None
-    return datetime.strptime(f"{v.group(1)}", "%d.%m.%Y") if v else None
+    return parse_date(v.group(1)) if v else None
+
+
+def parse_cents(amount: str) -> int:
+    """ German amount like -1.234,56 in integer cents, without a float round trip """
+    negative = amount.startswith("-")
+    euros, _, fraction = amount.lstrip("+-").partition(",")
+    cents = int(euros.replace(".", "") or 0) * 100 + int((fraction + "00")[:2])
+    return -cents if negative else cents
 
 
 def parse_float(v: Optional[re.Match]) -> Optional[float]:
     if len(v.groups()) != 1:
         return None
-    return float(v.group(1).replace(".", "").replace(",", "."))
+    return parse_cents(v.group(1)) / 100
 
 
-@dataclass
+@dataclass(slots=True)
 class Transaction:
     date: str
     valuta: str
@@ -43,8 +44,91 @@ class Transaction:
     description: str
     amount: float
 
-
-_STATEMENT_MONTH_REGEX = re.compile(r"^Kontoauszug\s([A-Za-z]+)\s(\d{4})$")
+    @property
+    def cents(self) -> int:
+        return round(self.amount * 100)
+
+
+class TransactionStore(Sequence):
+    """ Struct of arrays storage of transactions.
+
+        Every field is kept in its own column, amounts as exact integer cents in a packed int64 array.
+        Dates, issuers and types repeat across bookings and are interned, so each distinct value is stored once.
+        Items are returned as Transaction rows, changing a returned row does not change the store.
+    """
+    __slots__ = ("dates", "valutas", "issuers", "types", "descriptions", "cents")
+
+    def __init__(self, transactions: Iterable[Transaction] = ()):
+        self.dates: List[str] = list()
+        self.valutas: List[str] = list()
+        self.issuers: List[str] = list()
+        self.types: List[str] = list()
+        self.descriptions: List[str] = list()
+        self.cents = array("q")
+        self.extend(transactions)
+
+    def append(self, transaction: Transaction):
+        self.dates.append(sys.intern(transaction.date))
+        self.valutas.append(sys.intern(transaction.valuta))
+        self.issuers.append(sys.intern(transaction.issuer))
+        self.types.append(sys.intern(transaction.type))
+        self.descriptions.append(transaction.description)
+        self.cents.append(transaction.cents)
+
+    def extend(self, transactions: Iterable[Transaction]):
+        for transaction in transactions:
+            self.append(transaction)
+
+    @classmethod
+    def concat(cls, stores: Iterable['TransactionStore']) -> 'TransactionStore':
+        """ Join stores column by column without creating row objects """
+        result = cls()
+        for store in stores:
+            for column, values in zip(result.columns().values(), store.columns().values()):
+                column.extend(values)
+        return result
+
+    def columns(self) -> Dict[str, Sequence]:
+        """ Column name to values, in the field order of Transaction """
+        return {'date': self.dates, 'valuta': self.valutas, 'issuer': self.issuers, 'type': self.types,
+                'description': self.descriptions, 'cents': self.cents}
+
+    def __len__(self) -> int:
+        return len(self.cents)
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[Transaction, List[Transaction]]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        return Transaction(self.dates[idx], self.valutas[idx], self.issuers[idx], self.types[idx],
+                           self.descriptions[idx], self.cents[idx] / 100)
+
+    def __iter__(self) -> Iterator[Transaction]:
+        for date, valuta, issuer, tr_type, description, cents in zip(
+                self.dates, self.valutas, self.issuers, self.types, self.descriptions, self.cents):
+            yield Transaction(date, valuta, issuer, tr_type, description, cents / 100)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __reduce__(self):
+        return _restore_store, (self.dates, self.valutas, self.issuers, self.types, self.descriptions, self.cents)
+
+    def __repr__(self) -> str:
+        return f"TransactionStore({len(self)} transactions)"
+
+
+def _restore_store(dates, valutas, issuers, types, descriptions, cents) -> TransactionStore:
+    # -- Strings are interned again after being sent to or from a worker process
+    store = TransactionStore()
+    store.dates, store.valutas = [sys.intern(v) for v in dates], [sys.intern(v) for v in valutas]
+    store.issuers, store.types = [sys.intern(v) for v in issuers], [sys.intern(v) for v in types]
+    store.descriptions, store.cents = descriptions, cents
+    return store
+
+
+_STATEMENT_MONTH_REGEX = re.compile(r"^Kontoauszug\s([^\W\d_]+)\s(\d{4})$")
 _STATEMENT_DATE_REGEX = re.compile(r"^Datum\s(\d{2}\.\d{2}\.\d{4})$")
 _STATEMENT_NUMBER_REGEX = re.compile(r"^Auszugsnummer\s([0-9]{1,2})$")
 _STATEMENT_BALANCE_REGEX = re.compile(r"^Neuer\sSaldo\s(-?\d+\.?\d*,\d{1,2})\sEuro$")
@@ -59,9 +143,10 @@ class BankStatement:
     statement_date: str = ""
     statement_month: int = 0
     statement_year: int = 0
-    statement_balance: float = 0.0
-    statement_old_balance: float = 0.0
-    transactions: List[Transaction] = field(default_factory=list)
+    # -- None if missing from the statement header
+    statement_balance: Optional[float] = None
+    statement_old_balance: Optional[float] = None
+    transactions: TransactionStore = field(default_factory=TransactionStore)
     account_id: str = str()
     bank_id: str = str()
 
@@ -93,9 +178,9 @@ class BankStatement:
                 date = parse_statement_month(value)
                 value = date.year if date else value
             case 'statement_balance':
-                value = parse_float(value) if parse_float(value) else value
+                value = parse_float(value) if parse_float(value) is not None else value
             case 'statement_old_balance':
-                value = parse_float(value) if parse_float(value) else value
+                value = parse_float(value) if parse_float(value) is not None else value
             case 'account_id':
                 value = value.group(1).replace(" ", "")
             case _:
@@ -107,7 +192,14 @@ class BankStatement:
         self.transactions.append(transaction)
 
     def clear_transactions(self):
-        self.transactions = list()
+        self.transactions = TransactionStore()
+
+    def set_transactions(self, transactions: Iterable[Transaction]):
+        """ Replace all transactions, e.g. after filtering """
+        self.transactions = TransactionStore(transactions)
+
+    def iter_transactions(self) -> Iterator[Transaction]:
+        return iter(self.transactions)
 
     def __str__(self):
         statement_header = (f"Kontoauszug {self.statement_month} {self.statement_year} "
@@ -0,0 +1,38 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional
+
+# -- Month names as printed on the statements, independent of the system locale
+GERMAN_MONTHS = ("Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August", "September", "Oktober",
+                 "November", "Dezember")
+_MONTH_NUMBERS = {name.casefold(): number for number, name in enumerate(GERMAN_MONTHS, start=1)}
+_MONTH_NUMBERS["maerz"] = 3
+
+# -- A statement repeats few distinct dates, the memo only needs to hold a couple of years of bookings
+MEMO_SIZE = 4096
+
+
+def month_number(name: str) -> Optional[int]:
+    """ 1-12 for a German month name, case-insensitive, None if unknown """
+    return _MONTH_NUMBERS.get(name.strip().casefold())
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def parse_date(date: str) -> datetime:
+    """ dd.mm.yyyy as datetime, raises ValueError on invalid dates """
+    if len(date) == 10 and date[2] == "." and date[5] == "." and date[:2].isdigit() and date[3:5].isdigit() \
+            and date[6:].isdigit():
+        return datetime(int(date[6:]), int(date[3:5]), int(date[:2]))
+    return datetime.strptime(date, "%d.%m.%Y")
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def to_iso_date(date: str) -> str:
+    """ dd.mm.yyyy as ISO date with time, e.g. 2024-03-01T00:00:00 """
+    return parse_date(date).isoformat()
+
+
+def parse_month(name: str, year: str) -> Optional[datetime]:
+    """ First day of a month given as German name and year, None if the name is unknown """
+    number = month_number(name)
+    return datetime(int(year), number, 1) if number else None
@@ -0,0 +1,106 @@
+import json
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from ing_parser.cache import file_hash
+from ing_parser.data import BankStatement, TransactionStore
+
+
+@dataclass
+class DuplicateFile:
+    file: str
+    duplicate_of: str
+
+
+@dataclass
+class DuplicateStatement:
+    file: str
+    account_id: str
+    statement_year: int
+    statement_number: int
+    duplicate_of: str
+
+
+@dataclass
+class DuplicateBooking:
+    file: str
+    account_id: str
+    date: str
+    issuer: str
+    cents: int
+
+
+@dataclass
+class DuplicateReport:
+    files: List[DuplicateFile] = field(default_factory=list)
+    statements: List[DuplicateStatement] = field(default_factory=list)
+    bookings: List[DuplicateBooking] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return f"Dropped {len(self.files)} duplicate files, {len(self.statements)} duplicate statements and " \
+               f"{len(self.bookings)} duplicate bookings"
+
+    def write_json(self, out_file: Union[str, Path]):
+        with open(out_file, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, indent=2)
+
+
+class Deduplicator:
+    def __init__(self):
+        """
+        Drops statements and bookings that were already seen, in the order files are checked and filtered.
+
+        Files with the content hash of an earlier file are skipped before parsing. Parsed statements with the
+        IBAN, year and number of an earlier statement are dropped as a whole, e.g. a re-download with
+        different PDF metadata. Bookings are indexed by (IBAN, date, valuta, amount, issuer, description):
+        a booking is dropped if earlier statements already contain it at least as often as the current statement
+        did so far, so identical bookings within one statement are kept. Every check is a dict lookup, so the
+        cost grows linearly with the number of bookings. Dropped items are collected in report.
+        """
+        self.report = DuplicateReport()
+        self._files: Dict[str, str] = dict()
+        self._statements: Dict[Tuple[str, int, int], str] = dict()
+        self._bookings: Dict[tuple, int] = dict()
+
+    def is_duplicate_file(self, file: Union[str, Path]) -> bool:
+        content_hash = file_hash(file)
+        first = self._files.setdefault(content_hash, str(file))
+        if first == str(file):
+            return False
+        self.report.files.append(DuplicateFile(str(file), first))
+        return True
+
+    def filter_statement(self, statement: BankStatement, file: Union[str, Path]) -> Optional[BankStatement]:
+        """ None for a duplicate statement, otherwise the statement without bookings of earlier statements.
+            Duplicate bookings are removed with statement.set_transactions, which also drops a memoised DataFrame.
+        """
+        file = str(file)
+        if statement.account_id:
+            key = (statement.account_id, statement.statement_year, statement.statement_number)
+            first = self._statements.setdefault(key, file)
+            if first != file:
+                self.report.statements.append(DuplicateStatement(file, *key, first))
+                return None
+
+        transactions = statement.transactions
+        if not isinstance(transactions, TransactionStore):
+            transactions = TransactionStore(transactions)
+        columns = transactions.columns()
+        keys = list(zip([statement.account_id] * len(transactions), columns["date"], columns["valuta"],
+                        columns["cents"], columns["issuer"], columns["description"]))
+        counts: Dict[tuple, int] = dict()
+        keep = list()
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+            keep.append(counts[key] > self._bookings.get(key, 0))
+
+        for key, count in counts.items():
+            if count > self._bookings.get(key, 0):
+                self._bookings[key] = count
+
+        if not all(keep):
+            self.report.bookings += [DuplicateBooking(file, key[0], key[1], key[4], key[3])
+                                     for key, kept in zip(keys, keep) if not kept]
+            statement.set_transactions(t for t, kept in zip(transactions, keep) if kept)
+        return statement
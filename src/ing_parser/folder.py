@@ -1,20 +1,121 @@
+from __future__ import annotations
+
 import logging
+import os
+import re
+from collections import deque
+from functools import partial
 from pathlib import Path
-from typing import Union, Optional, List
+from typing import Union, Optional, List, Iterator, Tuple, Dict, Deque, TYPE_CHECKING
 import concurrent.futures
 
-import pandas as pd
-
 from ing_parser.base import IngBase
-from ing_parser.statement import IngStatement
+from ing_parser.batch import ErrorReport, FileLimits, IsolatedParser
+from ing_parser.cache import StatementCache
+from ing_parser.data import BankStatement, Transaction, TransactionStore
+from ing_parser.dedup import Deduplicator
+from ing_parser.profiling import FileProfile, Profiler, profile_stage
+from ing_parser.source import PdfSource
+from ing_parser.statement import IngStatement, transactions_to_dataframe
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+EXECUTORS = ("thread", "process")
+# -- account_type that matches the statements of every account
+ALL_ACCOUNTS = "all"
+_FILE_DATE_REGEX = re.compile(r"_(\d{8})(?!\d)")
+
+
+def file_account(file_path: Path) -> str:
+    """ Account number from an ING file name like Girokonto_5422021297_Kontoauszug_20180330.pdf """
+    parts = file_path.stem.split("_")
+    return parts[1] if len(parts) > 2 else file_path.stem
+
+
+def file_statement_order(file_path: Path) -> Tuple[str, str]:
+    """ Sort key of a statement file, the statement date of names like Girokonto_5422021297_Kontoauszug_20180330.pdf
+        and then the name, so files of all accounts and directories are ordered by date.
+    """
+    # -- Also matches copies like Girokonto_5422021297_Kontoauszug_20180330 (1).pdf, never the account number
+    match = _FILE_DATE_REGEX.search(file_path.stem)
+    return (match.group(1) if match else str()), file_path.name
+
+
+def parse_statement_file(file_path: PdfSource, cache: Optional[StatementCache] = None,
+                         skip_info_pages: bool = True) -> BankStatement:
+    """ Parse a single statement file or PDF content and return a lightweight, picklable BankStatement.
+        Module level so it can be sent to worker processes.
+    """
+    ing_statement = IngStatement(file_path, cache, skip_info_pages)
+    ing_statement.parse_ing_bank_statement()
+    return ing_statement.to_bank_statement()
+
+
+def profile_statement_file(file_path: Path, cache: Optional[StatementCache] = None,
+                           skip_info_pages: bool = True) -> Tuple[BankStatement, FileProfile]:
+    """ parse_statement_file with a worker local Profiler, its FileProfile is merged by the caller """
+    profiler = Profiler()
+    ing_statement = IngStatement(file_path, cache, skip_info_pages, profiler)
+    ing_statement.parse_ing_bank_statement()
+    return ing_statement.to_bank_statement(), profiler.file(file_path)
 
 
 class IngStatementsFolder(IngBase):
-    def __init__(self, source_directory: Union[str, Path], account_type: str = 'Giro'):
+    def __init__(self, source_directory: Union[str, Path], account_type: str = 'Giro',
+                 executor: str = 'thread', max_workers: Optional[int] = None, chunksize: Optional[int] = None,
+                 cache: Optional[StatementCache] = None, skip_info_pages: bool = True,
+                 profiler: Optional[Profiler] = None, recursive: bool = False, deduplicate: bool = False,
+                 limits: Optional[FileLimits] = None):
+        """
+        Parses all ING statement PDF files of an account type inside a directory.
+
+        account_type:
+            Substring of the file names to parse e.g. Giro or Extra, 'all' parses the statements of every account
+            in one shared worker pool. Results are grouped per account with statements_by_account.
+
+        executor:
+            'thread' parses into full IngStatement objects inside a ThreadPoolExecutor.
+            'process' parses in a ProcessPoolExecutor and collects plain BankStatement results,
+            which scales across all cores as text extraction is CPU-bound.
+        max_workers:
+            Number of workers, defaults to the executor default.
+        chunksize:
+            Number of files sent to a worker process at once, defaults to an even split per worker.
+        cache:
+            Optional StatementCache, only new or changed files are parsed from PDF.
+        skip_info_pages:
+            Do not extract pages following the closing balance, see IngStatement.
+        profiler:
+            Optional Profiler, collects per file and per stage timings from threads and worker processes.
+        recursive:
+            Also search all sub directories, the tree is traversed once.
+        deduplicate:
+            Skip files, statements and bookings that were already parsed from another file, see Deduplicator.
+            What was dropped is reported in deduplicator.report.
+        limits:
+            Parse every file in its own worker process with these FileLimits instead of the executor, see
+            IsolatedParser. Files that fail are left out of the results and reported in errors, which covers
+            the latest run.
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor {executor}, expected one of {', '.join(EXECUTORS)}")
+
         self.source_directory = Path(source_directory)
         self.account_type = account_type.lower()
+        self.executor = executor
+        self.max_workers = max_workers
+        self.chunksize = chunksize
+        self.cache = cache
+        self.skip_info_pages = skip_info_pages
+        self.profiler = profiler
+        self.recursive = recursive
+        self.deduplicator: Optional[Deduplicator] = Deduplicator() if deduplicate else None
+        self.limits = limits
+        self.errors: Optional[ErrorReport] = ErrorReport() if limits else None
         self._df: Optional[pd.DataFrame] = None
-        self.statements: List[IngStatement] = list()
+        self.statements: List[BankStatement] = list()
+        self.files: List[Path] = list()
 
     @property
     def dataframe(self) -> pd.DataFrame:
@@ -23,25 +124,186 @@ class IngStatementsFolder(IngBase):
         return self._df
 
     @staticmethod
-    def process_file(file_path: Path):
-        ing_statement = IngStatement(file_path)
+    def process_file(file_path: Path, cache: Optional[StatementCache] = None, skip_info_pages: bool = True,
+                     profiler: Optional[Profiler] = None):
+        ing_statement = IngStatement(file_path, cache, skip_info_pages, profiler)
         ing_statement.parse_ing_bank_statement()
         return ing_statement
 
-    def parse(self):
+    def find_files(self) -> List[Path]:
+        """ Statement files in statement order, see file_statement_order, independent of the directory listing """
         pdf_files = list()
-        for file in self.source_directory.glob("*.pdf"):
-            if self._SEARCH_TERM in file.name.lower() and self.account_type in file.name.lower():
+        account_type = "" if self.account_type == ALL_ACCOUNTS else self.account_type
+        candidates = self.source_directory.rglob("*.pdf") if self.recursive else self.source_directory.glob("*.pdf")
+        for file in candidates:
+            if self._SEARCH_TERM in file.name.lower() and account_type in file.name.lower():
                 pdf_files.append(file)
+        return sorted(pdf_files, key=file_statement_order)
+
+    def iter_statements(self) -> Iterator[IngStatement]:
+        """ Yield an unparsed IngStatement per file, transactions are read with IngStatement.iter_transactions """
+        for file in self._unique_files(self.find_files()):
+            yield IngStatement(file, self.cache, self.skip_info_pages, self.profiler)
+
+    def iter_transactions(self, parallel: bool = False, window: Optional[int] = None) -> Iterator[Transaction]:
+        """ Yield the transactions of all files in statement order while they are parsed.
+            By default files are parsed one after another and only one statement is kept in memory.
+            With parallel, up to window files are parsed at once, see iter_parsed_statements.
+            With limits, files are always parsed in isolated worker processes.
+        """
+        if parallel or self.limits:
+            for statement in self.iter_parsed_statements(window):
+                yield from statement.transactions
+            return
+        for statement in self.iter_statements():
+            if self.deduplicator:
+                # -- Duplicates are only known once the whole statement is parsed
+                statement.parse_ing_bank_statement()
+                if self.deduplicator.filter_statement(statement, statement.source_file) is None:
+                    continue
+            yield from statement.iter_transactions()
+
+    def iter_parsed_statements(self, window: Optional[int] = None) -> Iterator[BankStatement]:
+        """ Yield parsed statements in statement order as soon as all preceding files are done.
+
+            Files are parsed in parallel with the configured executor. At most window files, two per worker by
+            default, are in flight or finished and waiting for a slower predecessor. This reorder buffer bounds
+            memory, and the output is identical between runs while downstream writers start with the first file.
+        """
+        files = self._unique_files(self.find_files())
+        results = self._isolated_parser().iter_parse(files, window) if self.limits else self._iter_pool(files, window)
+        for file, result in results:
+            if result is not None and self.deduplicator:
+                result = self.deduplicator.filter_statement(result, file)
+            if result is not None:
+                yield result
 
+    def _iter_pool(self, files: List[Path], window: Optional[int]) -> Iterator[Tuple[Path, BankStatement]]:
+        window = window or 2 * (self.max_workers or os.cpu_count() or 1)
+        pdf_files = iter(files)
+        pending: Deque[Tuple[Path, concurrent.futures.Future]] = deque()
+
+        if self.executor == "process":
+            pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+            worker = partial(profile_statement_file if self.profiler else parse_statement_file, cache=self.cache,
+                             skip_info_pages=self.skip_info_pages)
+        else:
+            pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+            worker = partial(self.process_file, cache=self.cache, skip_info_pages=self.skip_info_pages,
+                             profiler=self.profiler)
+
+        with pool:
+            try:
+                while True:
+                    for file in pdf_files:
+                        pending.append((file, pool.submit(worker, file)))
+                        if len(pending) >= window:
+                            break
+                    if not pending:
+                        return
+
+                    file, future = pending.popleft()
+                    result = future.result()
+                    if self.executor == "process" and self.profiler:
+                        result, profile = result
+                        self.profiler.add_file(profile)
+                    yield file, result
+            finally:
+                # -- Leaving the iterator early drops files that did not start yet
+                for _, future in pending:
+                    future.cancel()
+
+    def parse_statements(self) -> List[BankStatement]:
+        """ Parse all files into statements without building a DataFrame """
+        with profile_stage(self.profiler, "parse_files"):
+            self.files = self._unique_files(self.find_files())
+            self.statements = self.parse_files(self.files)
+        if self.limits:
+            # -- Files that failed are None and reported in errors
+            parsed = [(file, statement) for file, statement in zip(self.files, self.statements)
+                      if statement is not None]
+            self.files = [file for file, _ in parsed]
+            self.statements = [statement for _, statement in parsed]
+        if self.deduplicator:
+            with profile_stage(self.profiler, "deduplicate"):
+                results = [(file, self.deduplicator.filter_statement(statement, file))
+                           for file, statement in zip(self.files, self.statements)]
+                self.files = [file for file, statement in results if statement is not None]
+                self.statements = [statement for _, statement in results if statement is not None]
+        return self.statements
+
+    def _unique_files(self, pdf_files: List[Path]) -> List[Path]:
+        if not self.deduplicator:
+            return pdf_files
+        with profile_stage(self.profiler, "deduplicate"):
+            return [file for file in pdf_files if not self.deduplicator.is_duplicate_file(file)]
+
+    def parse(self):
+        self.parse_statements()
+        with profile_stage(self.profiler, "dataframe"):
+            return transactions_to_dataframe(TransactionStore.concat(s.transactions for s in self.statements))
+
+    def statements_by_account(self) -> Dict[str, List[BankStatement]]:
+        """ Parsed statements grouped by IBAN, or by the file name account number if no IBAN was found """
+        if not self.statements:
+            self.parse_statements()
+
+        accounts = dict()
+        for file, statement in zip(self.files, self.statements):
+            accounts.setdefault(statement.account_id or file_account(file), list()).append(statement)
+        return accounts
+
+    def account_dataframes(self) -> Dict[str, pd.DataFrame]:
+        """ One transaction DataFrame per account """
+        return {account: transactions_to_dataframe(TransactionStore.concat(s.transactions for s in statements))
+                for account, statements in self.statements_by_account().items()}
+
+    def parse_files(self, pdf_files: List[Path]) -> List[Optional[BankStatement]]:
+        """ Parse the given files with the configured executor, results are in the order of pdf_files.
+            With limits, files that failed are None.
+        """
+        if self.limits:
+            return self._isolated_parser().parse(pdf_files)
+        if self.executor == "process":
+            return self._parse_processes(pdf_files)
+        return self._parse_threads(pdf_files)
+
+    def _parse_threads(self, pdf_files: List[Path]) -> List[BankStatement]:
         # Use ThreadPoolExecutor to process the files concurrently
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            futures = [executor.submit(self.process_file, file) for file in pdf_files]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.process_file, file, self.cache, self.skip_info_pages, self.profiler)
+                       for file in pdf_files]
+
+            # Report progress as they complete
+            for completed, _ in enumerate(concurrent.futures.as_completed(futures), start=1):
+                logging.info(f"Completed parsing {completed}/{len(pdf_files)} files")
+
+        return [future.result() for future in futures]
+
+    def _parse_processes(self, pdf_files: List[Path]) -> List[BankStatement]:
+        statements = list()
+        chunksize = self.chunksize or self._default_chunksize(len(pdf_files), self.max_workers or os.cpu_count() or 1)
 
-            # Collect results as they complete
-            for future in concurrent.futures.as_completed(futures):
-                ing_statement = future.result()
-                self.statements.append(ing_statement)
-                logging.info(f"Completed parsing {len(self.statements)}/{len(pdf_files)} files")
+        worker = partial(profile_statement_file if self.profiler else parse_statement_file, cache=self.cache,
+                         skip_info_pages=self.skip_info_pages)
 
-        return pd.concat([s.dataframe for s in self.statements])
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            for result in executor.map(worker, pdf_files, chunksize=chunksize):
+                if self.profiler:
+                    result, profile = result
+                    self.profiler.add_file(profile)
+                statements.append(result)
+                logging.info(f"Completed parsing {len(statements)}/{len(pdf_files)} files")
+
+        return statements
+
+    def _isolated_parser(self) -> IsolatedParser:
+        # -- A new report per run, parsing again must not count files and errors twice
+        self.errors = ErrorReport()
+        return IsolatedParser(self.limits, self.max_workers, self.cache, self.skip_info_pages, self.profiler,
+                              self.errors)
+
+    @staticmethod
+    def _default_chunksize(num_files: int, num_workers: int) -> int:
+        # -- A few chunks per worker keeps workers busy without paying IPC per file
+        return max(1, num_files // (num_workers * 4))
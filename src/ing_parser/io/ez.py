@@ -1,14 +1,49 @@
 import csv
+from itertools import islice
 from dataclasses import dataclass, field
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Tuple, Iterable, Iterator, Union, Optional, Dict, Sequence
 
+import numpy as np
 import pandas as pd
-from ing_parser.data import BankStatement, Transaction
-
-
-@dataclass
+from ing_parser.categorize import Categorizer, CategoryRule
+from ing_parser.data import BankStatement, Transaction, TransactionStore
+from ing_parser.io.writer import column_rows, write_csv_rows, write_dataframe
+
+EZ_COLUMNS = ("Time", "Timezone", "Type", "Category", "Sub Category", "Account", "Account Currency", "Amount",
+              "Account2", "Account2 Currency", "Account2 Amount", "Geographic Location", "Tags", "Description")
+# -- Transactions converted at once by write_ez_csv, bounds memory while streaming
+CHUNK_SIZE = 10000
+EZ_CSV_OPTIONS = {"sep": ",", "doublequote": False, "quoting": csv.QUOTE_NONE, "quotechar": None, "escapechar": "\\"}
+
+# -- Category and sub category per ING transaction type, used if no category rule matches
+EZ_CATEGORIES = {
+    "Lastschrift": ("Miscellaneous", "Other Expense"),
+    "Entgelt": ("Finance & Insurance", "Service Charge"),
+    "Abbuchung": ("Miscellaneous", "Other Income"),
+    "Gehalt/Rente": ("Occupational Earnings", "Salary Income"),
+    "Gutschrift": ("Miscellaneous", "Other Income"),
+    "Retoure": ("Miscellaneous", "Other Income"),
+    "Ueberweisung": ("Miscellaneous", "Other Expense"),
+    "Dauerauftrag/Terminueberw.": ("Miscellaneous", "Other Expense"),
+    # Add more mappings as needed
+}
+EZ_TYPES = {
+    "Lastschrift": "Expense",
+    "Entgelt": "Expense",
+    "Abbuchung": "Expense",
+    "Gehalt/Rente": "Income",
+    "Gutschrift": "Income",
+    "Retoure": "Income",
+    "Ueberweisung": "Expense",
+    "Dauerauftrag/Terminueberw.": "Expense"
+    # Add more mappings as needed
+}
+
+
+@dataclass(slots=True)
 class EzBookKeepingTransactions:
     time: str
     timezone: str
@@ -17,7 +52,7 @@ class EzBookKeepingTransactions:
     sub_category: str
     account: str
     account_currency: str
-    amount: float
+    amount: Union[float, int]
     account2: str
     account2_currency: str
     account2_amount: float
@@ -26,107 +61,145 @@ class EzBookKeepingTransactions:
     tags: List[str] = field(default_factory=list)
 
     @classmethod
-    def from_transaction(cls, transaction: Transaction) -> 'EzBookKeepingTransactions':
-        ez_transaction_type = "Income"
-        local_now = datetime.now()
-        tz_offset = local_now.utcoffset()
-
-        # Format the offset as +HH:MM or -HH:MM
-        if tz_offset:
-            sign = '+' if tz_offset.days >= 0 else '-'
-            hours, remainder = divmod(abs(tz_offset).seconds, 3600)
-            minutes = remainder // 60
-            timezone_offset = f"{sign}{hours:02}:{minutes:02}"
-        else:
-            timezone_offset = "+00:00"
-
-        date_obj = datetime.fromisoformat(transaction.date)
-        if transaction.amount < 0:
-            ez_transaction_type = "Expense"
-
-        desc = transaction.issuer + " " + transaction.description.replace("\n", "; ")
-        desc = desc.replace('"', '')
+    def from_transaction(cls, transaction: Transaction, cents: bool = False,
+                         rule: Optional[CategoryRule] = None,
+                         timezone: Optional[str] = None) -> 'EzBookKeepingTransactions':
+        """ With cents, amount is the exact absolute amount in integer cents.
+            The category of a matching rule replaces the category derived from the transaction type.
+            timezone defaults to local_timezone_offset, pass it when converting many transactions.
+        """
+        category, sub_category = (rule.category, rule.sub_category) if rule else map_category(transaction.type)
 
         return cls(
-            time=date_obj.strftime("%Y-%m-%d %H:%M:%S"),
-            timezone=timezone_offset,
-            type=ez_transaction_type,
-            category=map_category(transaction.type)[0],
-            sub_category=map_category(transaction.type)[1],
+            time=ez_time(transaction.date),
+            timezone=timezone or local_timezone_offset(),
+            type="Expense" if transaction.amount < 0 else "Income",
+            category=category,
+            sub_category=sub_category,
             account="ING",
             account_currency="EUR",  # Assuming the currency is EUR; adjust as needed
-            amount=abs(transaction.amount),
+            amount=abs(transaction.cents) if cents else abs(transaction.amount),
             account2="",
             account2_currency="",  # Assuming the currency is EUR; adjust as needed
             account2_amount=0.0,
             geographic_location="",
             tags=[],  # Add any relevant tags here
-            description=desc
+            description=ez_description(transaction.issuer, transaction.description)
         )
 
     @classmethod
-    def from_bank_statement(cls, bank_statement: BankStatement) -> List['EzBookKeepingTransactions']:
-        return [cls.from_transaction(transaction) for transaction in bank_statement.transactions]
+    def from_transactions(cls, transactions: Iterable[Transaction], cents: bool = False,
+                          categorizer: Optional[Categorizer] = None) -> Iterator['EzBookKeepingTransactions']:
+        timezone = local_timezone_offset()
+        for transaction in transactions:
+            rule = categorizer.match_transaction(transaction) if categorizer else None
+            yield cls.from_transaction(transaction, cents, rule, timezone)
+
+    @classmethod
+    def from_bank_statement(cls, bank_statement: BankStatement, cents: bool = False,
+                            categorizer: Optional[Categorizer] = None) -> List['EzBookKeepingTransactions']:
+        return list(cls.from_transactions(bank_statement.transactions, cents, categorizer))
+
+    def to_row(self) -> tuple:
+        """ Values in the order of EZ_COLUMNS """
+        return (self.time, self.timezone, self.type, self.category, self.sub_category, self.account,
+                self.account_currency, self.amount, self.account2, self.account2_currency, self.account2_amount,
+                self.geographic_location, ",".join(self.tags), self.description)
+
+
+def local_timezone_offset() -> str:
+    """ Offset of datetime.now() as +HH:MM or -HH:MM """
+    tz_offset = datetime.now().utcoffset()
+    if not tz_offset:
+        return "+00:00"
+    sign = '+' if tz_offset.days >= 0 else '-'
+    hours, remainder = divmod(abs(tz_offset).seconds, 3600)
+    return f"{sign}{hours:02}:{remainder // 60:02}"
+
+
+@lru_cache(maxsize=4096)
+def ez_time(date: str) -> str:
+    """ ISO date of a transaction as ezBookKeeping time, e.g. 2024-03-01 00:00:00 """
+    return datetime.fromisoformat(date).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def ez_description(issuer: str, description: str) -> str:
+    return f"{issuer} {description.replace(chr(10), '; ')}".replace('"', '')
+
+
+def ez_columns(transactions: Sequence[Transaction], cents: bool = False,
+               categorizer: Optional[Categorizer] = None) -> Dict[str, Sequence]:
+    """ EZ_COLUMNS of all transactions, converted column by column.
+
+        Constant columns and the timezone are computed once, amounts and types in one numpy pass over the
+        cents, times once per distinct date and categories once per distinct type or with categorizer.
+    """
+    if not isinstance(transactions, TransactionStore):
+        transactions = TransactionStore(transactions)
+    columns = transactions.columns()
+    num_rows = len(transactions)
+    amounts = np.frombuffer(columns["cents"], dtype=np.int64) if num_rows else np.zeros(0, dtype=np.int64)
+
+    if categorizer:
+        categories = [(rule.category, rule.sub_category) if rule else map_category(tr_type)
+                      for rule, tr_type in zip(categorizer.categorize(transactions), columns["type"])]
+    else:
+        categories = [map_category(tr_type) for tr_type in columns["type"]]
+
+    return dict(zip(EZ_COLUMNS, (
+        [ez_time(date) for date in columns["date"]],
+        [local_timezone_offset()] * num_rows,
+        np.where(amounts < 0, "Expense", "Income").astype(object),
+        [category for category, _ in categories],
+        [sub_category for _, sub_category in categories],
+        ["ING"] * num_rows,
+        ["EUR"] * num_rows,
+        np.abs(amounts) if cents else np.abs(amounts) / 100,
+        [""] * num_rows,
+        [""] * num_rows,
+        np.zeros(num_rows),
+        [""] * num_rows,
+        [""] * num_rows,
+        [ez_description(issuer, description) for issuer, description in zip(columns["issuer"],
+                                                                             columns["description"])],
+    )))
 
 
 def map_category(transaction_type: str) -> Tuple[str, str]:
-    type_mapping = {
-        "Lastschrift": ("Miscellaneous", "Other Expense"),
-        "Entgelt": ("Finance & Insurance", "Service Charge"),
-        "Abbuchung": ("Miscellaneous", "Other Income"),
-        "Gehalt/Rente": ("Occupational Earnings", "Salary Income"),
-        "Gutschrift": ("Miscellaneous", "Other Income"),
-        "Retoure": ("Miscellaneous", "Other Income"),
-        "Ueberweisung": ("Miscellaneous", "Other Expense"),
-        "Dauerauftrag/Terminueberw.": ("Miscellaneous", "Other Expense"),
-        # Add more mappings as needed
-    }
-    return type_mapping.get(transaction_type, ("Miscellaneous", "Other Expense"))
+    return EZ_CATEGORIES.get(transaction_type, ("Miscellaneous", "Other Expense"))
 
 
 def map_type(transaction_type: str) -> str:
-    type_mapping = {
-        "Lastschrift": "Expense",
-        "Entgelt": "Expense",
-        "Abbuchung": "Expense",
-        "Gehalt/Rente": "Income",
-        "Gutschrift": "Income",
-        "Retoure": "Income",
-        "Ueberweisung": "Expense",
-        "Dauerauftrag/Terminueberw.": "Expense"
-        # Add more mappings as needed
-    }
-    return type_mapping.get(transaction_type, transaction_type)
-
-
-def convert_to_ez_dataframe(statements: List[BankStatement]) -> pd.DataFrame:
-    ez_export_list = []
-
-    for statement in statements:
-        ez_export_list.extend(EzBookKeepingTransactions.from_bank_statement(statement))
-
-    # Create a DataFrame from the list of EzBookKeepingExport objects
-    return pd.DataFrame([
-        {
-            "Time": e.time,
-            "Timezone": e.timezone,
-            "Type": e.type,
-            "Category": e.category,
-            "Sub Category": e.sub_category,
-            "Account": e.account,
-            "Account Currency": e.account_currency,
-            "Amount": e.amount,
-            "Account2": e.account2,
-            "Account2 Currency": e.account2_currency,
-            "Account2 Amount": e.account2_amount,
-            "Geographic Location": e.geographic_location,
-            "Tags": ",".join(e.tags),
-            "Description": e.description
-        }
-        for e in ez_export_list
-    ])
+    return EZ_TYPES.get(transaction_type, transaction_type)
+
+
+def convert_to_ez_dataframe(statements: List[BankStatement], cents: bool = False,
+                            categorizer: Optional[Categorizer] = None) -> pd.DataFrame:
+    """ ez DataFrame of the transactions of all statements, e.g. of a whole folder, see ez_columns """
+    return pd.DataFrame(ez_columns(TransactionStore.concat(s.transactions for s in statements), cents, categorizer))
 
 
 def export_ez_csv(out_file: Path, df: pd.DataFrame):
-    return df.to_csv(out_file, index=False, sep=",", doublequote=False,
-                     quoting=csv.QUOTE_NONE, quotechar="",  escapechar="\\")
+    return export_ez(out_file, df)
+
+
+def export_ez(out_file: Union[str, Path], df: pd.DataFrame, fmt: str = "csv",
+              compression: Optional[str] = None) -> List[Path]:
+    """ Write an ez DataFrame in any format of writer.OUTPUT_FORMATS, csv uses the ezBookKeeping dialect """
+    return write_dataframe(df, out_file, fmt, compression=compression, **(EZ_CSV_OPTIONS if fmt == "csv" else {}))
+
+
+def write_ez_csv(out_file: Union[str, Path], transactions: Iterable[Transaction], cents: bool = False,
+                 categorizer: Optional[Categorizer] = None) -> int:
+    """ Stream transactions into an ezBookKeeping CSV file, the same format as export_ez_csv writes.
+        Transactions are converted with ez_columns in chunks of CHUNK_SIZE.
+    """
+    rows = (row for chunk in _chunks(transactions) for row in column_rows(ez_columns(chunk, cents, categorizer)))
+    return write_csv_rows(out_file, EZ_COLUMNS, rows, delimiter=",", doublequote=False,
+                          quoting=csv.QUOTE_NONE, quotechar=None, escapechar="\\")
+
+
+def _chunks(transactions: Iterable[Transaction]) -> Iterator[TransactionStore]:
+    transactions = iter(transactions)
+    while chunk := TransactionStore(islice(transactions, CHUNK_SIZE)):
+        yield chunk
@@ -0,0 +1,74 @@
+import csv
+import heapq
+import tempfile
+from itertools import islice
+from operator import itemgetter
+from pathlib import Path
+from typing import Union, Iterable, Iterator, List, Optional, Sequence
+
+from ing_parser.data import Transaction
+from ing_parser.io.writer import CSV_COLUMNS, transaction_row, write_csv_rows
+
+DEFAULT_CHUNK_SIZE = 50000
+# -- Runs merged at once, more runs are merged in several passes to bound the number of open files
+MERGE_FAN_IN = 64
+
+_RUN_OPTIONS = {"delimiter": ";", "quoting": csv.QUOTE_ALL}
+_row_date = itemgetter(0)
+
+
+def write_sorted_transactions_csv(out_file: Union[str, Path], transactions: Iterable[Transaction],
+                                  chunk_size: int = DEFAULT_CHUNK_SIZE, cents: bool = False,
+                                  tmp_dir: Optional[Union[str, Path]] = None) -> int:
+    """ Write the default CSV output sorted newest first with an external merge sort, returns the row count.
+
+        Transactions are consumed as they are produced, e.g. from IngStatementsFolder.iter_transactions,
+        sorted in runs of chunk_size rows and spilled to temporary files in tmp_dir. The runs are then merged
+        by date in one k-way merge, so peak memory depends on chunk_size instead of the number of transactions.
+        Statements are in date order, which makes sorting a run nearly linear. Rows of the same day keep
+        their parse order, the output is identical to write_transactions_csv over newest_first.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+
+    rows = (transaction_row(t, cents) for t in transactions)
+    with tempfile.TemporaryDirectory(prefix="ing_merge_", dir=tmp_dir) as run_dir:
+        run_dir = Path(run_dir)
+        runs = list()
+        while chunk := sorted(islice(rows, chunk_size), key=_row_date, reverse=True):
+            runs.append(_write_run(run_dir, len(runs), chunk))
+            del chunk
+
+        level = 0
+        while len(runs) > MERGE_FAN_IN:
+            level += 1
+            # -- Consecutive groups keep the run order, so rows of the same day stay in parse order
+            runs = [_merge_to_run(run_dir, f"{level}_{idx}", runs[start:start + MERGE_FAN_IN])
+                    for idx, start in enumerate(range(0, len(runs), MERGE_FAN_IN))]
+
+        return write_csv_rows(out_file, CSV_COLUMNS, _merge(runs), **_RUN_OPTIONS)
+
+
+def _write_run(run_dir: Path, name: Union[int, str], rows: Iterable[Sequence[str]]) -> Path:
+    run_file = run_dir / f"run_{name}.csv"
+    write_csv_rows(run_file, CSV_COLUMNS, rows, **_RUN_OPTIONS)
+    return run_file
+
+
+def _merge_to_run(run_dir: Path, name: str, runs: List[Path]) -> Path:
+    run_file = _write_run(run_dir, name, _merge(runs))
+    for run in runs:
+        run.unlink()
+    return run_file
+
+
+def _read_run(run_file: Path) -> Iterator[List[str]]:
+    with open(run_file, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f, **_RUN_OPTIONS)
+        next(reader, None)
+        yield from reader
+
+
+def _merge(runs: List[Path]) -> Iterator[List[str]]:
+    # -- heapq.merge is stable, rows of equal dates are taken from earlier runs first
+    return heapq.merge(*(_read_run(run) for run in runs), key=_row_date, reverse=True)
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import csv
+import importlib.util
+import os
+from pathlib import Path
+from typing import Union, Iterable, Iterator, Sequence, Tuple, Optional, List, Dict, TYPE_CHECKING
+
+from ing_parser.data import Transaction
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+CSV_COLUMNS = ("date", "valuta", "issuer", "type", "description", "amount")
+CSV_OPTIONS = {"sep": ";", "quoting": csv.QUOTE_ALL}
+
+OUTPUT_FORMATS = ("csv", "parquet", "feather", "jsonl")
+FORMAT_EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "feather": ".arrow", "jsonl": ".jsonl"}
+# -- Formats written through the optional pyarrow dependency
+ARROW_FORMATS = ("parquet", "feather")
+
+
+def transaction_row(transaction: Transaction, cents: bool = False) -> Tuple[str, ...]:
+    """ Format a Transaction the way the default CSV output writes it, optionally with the amount in cents """
+    return (transaction.date[:10], transaction.valuta[:10], transaction.issuer, transaction.type,
+            transaction.description, str(transaction.cents) if cents else repr(transaction.amount))
+
+
+def write_csv_rows(out_file: Union[str, Path], columns: Sequence[str], rows: Iterable[Sequence], **csv_options) -> int:
+    """ Write rows to a CSV file as they are produced, returns the number of written rows """
+    num_rows = 0
+    with open(out_file, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, lineterminator=os.linesep, **csv_options)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            num_rows += 1
+    return num_rows
+
+
+def column_rows(columns: Dict[str, Sequence]) -> Iterator[tuple]:
+    """ Rows of column arrays, e.g. from ez_columns or yaffa_columns, for write_csv_rows """
+    # -- Plain Python values, as the csv module formats numpy scalars differently
+    return zip(*(c.tolist() if hasattr(c, "tolist") else c for c in columns.values()))
+
+
+def write_transactions_csv(out_file: Union[str, Path], transactions: Iterable[Transaction],
+                           cents: bool = False) -> int:
+    """ Stream transactions into the default semicolon separated, fully quoted CSV output """
+    return write_csv_rows(out_file, CSV_COLUMNS, (transaction_row(t, cents) for t in transactions),
+                          delimiter=";", quoting=csv.QUOTE_ALL)
+
+
+def newest_first(transactions: Iterable[Transaction]) -> List[Transaction]:
+    """ Transactions sorted by booking date, newest first and in parse order within a day """
+    return sorted(transactions, key=lambda t: t.date, reverse=True)
+
+
+def is_plain_csv(out_file: Union[str, Path], fmt: str = "csv", partitioned: bool = False,
+                 compression: Optional[str] = None) -> bool:
+    """ True if the output is an uncompressed, unpartitioned CSV file that write_transactions_csv can write
+        without pandas, which is the slowest import of a short run.
+    """
+    return fmt == "csv" and not partitioned and not compression and Path(out_file).suffix.lower() == ".csv"
+
+
+def require_pyarrow(fmt: str):
+    if fmt in ARROW_FORMATS and importlib.util.find_spec("pyarrow") is None:
+        raise ImportError(f"Writing {fmt} requires pyarrow, install it with: pip install ing_parse[arrow]")
+
+
+def write_dataframe(df: pd.DataFrame, out_file: Union[str, Path], fmt: str = "csv",
+                    partition_cols: Optional[List[str]] = None, compression: Optional[str] = None,
+                    **csv_options) -> List[Path]:
+    """ Write a DataFrame in one of OUTPUT_FORMATS, returns the written files.
+
+        parquet and feather keep the column dtypes, so loading them needs no parsing. With partition_cols,
+        out_file is a directory with one hive style sub directory per value, e.g. out/statement_year=2020/.
+        compression defaults to the format default: inferred from the file name for csv and jsonl,
+        snappy for parquet and lz4 for feather. csv_options are only used for csv.
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {fmt}, expected one of {', '.join(OUTPUT_FORMATS)}")
+    require_pyarrow(fmt)
+
+    out_file = Path(out_file)
+    if not partition_cols:
+        out_file.parent.mkdir(parents=True, exist_ok=True)
+        _write_frame(df, out_file, fmt, compression, csv_options)
+        return [out_file]
+
+    written = list()
+    for values, partition in df.groupby(partition_cols, sort=True, observed=True):
+        directory = out_file.joinpath(*(f"{c}={v}" for c, v in zip(partition_cols, values)))
+        directory.mkdir(parents=True, exist_ok=True)
+        file = directory / f"part-0{FORMAT_EXTENSIONS[fmt]}"
+        _write_frame(partition.drop(columns=partition_cols), file, fmt, compression, csv_options)
+        written.append(file)
+    return written
+
+
+def _write_frame(df: pd.DataFrame, out_file: Path, fmt: str, compression: Optional[str], csv_options: dict):
+    match fmt:
+        case "csv":
+            df.to_csv(out_file, index=False, compression=compression or "infer", **csv_options)
+        case "parquet":
+            df.to_parquet(out_file, index=False, compression=compression or "snappy")
+        case "feather":
+            # -- Arrow IPC requires a default index
+            df.reset_index(drop=True).to_feather(out_file, compression=compression or "lz4")
+        case "jsonl":
+            df.to_json(out_file, orient="records", lines=True, date_format="iso", compression=compression or "infer")
@@ -1,12 +1,30 @@
+import csv
 from dataclasses import dataclass, field
-from typing import List
+from pathlib import Path
+from typing import List, Iterable, Iterator, Union, Optional, Sequence, Dict
 
+import numpy as np
 import pandas as pd
 
-from ing_parser.data import BankStatement
-
-
-@dataclass
+from ing_parser.categorize import Categorizer
+from ing_parser.data import BankStatement, Transaction, TransactionStore
+from ing_parser.io.writer import column_rows, write_csv_rows, write_dataframe, CSV_OPTIONS
+
+YAFFA_COLUMNS = ("date", "valuta", "account_from", "type", "category", "comment", "amount", "account_to")
+YAFFA_TYPES = {
+    "Lastschrift": "Withdraw",
+    "Entgelt": "Withdraw",
+    "Abbuchung": "Withdraw",
+    "Gehalt/Rente": "Deposit",
+    "Gutschrift": "Deposit",
+    "Retoure": "Deposit",
+    "Ueberweisung": "Transfer",
+    "Dauerauftrag/Terminueberw.": "Scheduled"
+    # Add more mappings as needed
+}
+
+
+@dataclass(slots=True)
 class YaffaTransaction:
     date: str
     valuta: str
@@ -15,23 +33,77 @@ class YaffaTransaction:
     org_type: str
     category: str # Added for Yaffa
     comment: str  # Changed from description to comment
-    amount: float
+    amount: Union[float, int]
     account_to: str = ""  # Added new field
 
+    @classmethod
+    def from_transaction(cls, transaction: Transaction, account_id: str, cents: bool = False,
+                         category: str = str()) -> 'YaffaTransaction':
+        """ With cents, amount is the exact absolute amount in integer cents """
+        return cls(
+            date=transaction.date,
+            valuta=transaction.valuta,
+            account_from=transaction.issuer,  # Changed from issuer to account_from
+            type=map_type(transaction.type),
+            org_type=transaction.type,
+            category=category,
+            comment=transaction.description,  # Changed from description to comment
+            amount=abs(transaction.cents) if cents else abs(transaction.amount),
+            account_to=account_id  # Always set BankStatement.account_id in that field
+        )
+
+    def to_row(self) -> tuple:
+        """ Values in the order of YAFFA_COLUMNS """
+        return (self.date, self.valuta, self.account_from, self.type, self.category, self.comment, self.amount,
+                self.account_to)
+
 
 def map_type(transaction_type: str) -> str:
-    type_mapping = {
-        "Lastschrift": "Withdraw",
-        "Entgelt": "Withdraw",
-        "Abbuchung": "Withdraw",
-        "Gehalt/Rente": "Deposit",
-        "Gutschrift": "Deposit",
-        "Retoure": "Deposit",
-        "Ueberweisung": "Transfer",
-        "Dauerauftrag/Terminueberw.": "Scheduled"
-        # Add more mappings as needed
-    }
-    return type_mapping.get(transaction_type, transaction_type)
+    return YAFFA_TYPES.get(transaction_type, transaction_type)
+
+
+def category_names(transactions: Sequence[Transaction], categorizer: Optional[Categorizer]) -> List[str]:
+    """ Hierarchical category name per transaction, empty if no rule matches or without categorizer """
+    if categorizer is None:
+        return [str()] * len(transactions)
+    return [rule.name if rule else str() for rule in categorizer.categorize(transactions)]
+
+
+def statement_transactions(statement: BankStatement) -> TransactionStore:
+    """ Transactions of a statement, an IngStatement that was not parsed yet is parsed while reading them """
+    if len(statement.transactions):
+        return statement.transactions
+    return TransactionStore(statement.iter_transactions())
+
+
+def yaffa_columns(transactions: Sequence[Transaction], account_ids: Sequence[str], cents: bool = False,
+                  categorizer: Optional[Categorizer] = None) -> Dict[str, Sequence]:
+    """ YAFFA_COLUMNS of all transactions converted column by column, account_ids has one entry per transaction """
+    if not isinstance(transactions, TransactionStore):
+        transactions = TransactionStore(transactions)
+    columns = transactions.columns()
+    amounts = np.frombuffer(columns["cents"], dtype=np.int64) if len(transactions) else np.zeros(0, dtype=np.int64)
+
+    return dict(zip(YAFFA_COLUMNS, (
+        columns["date"],
+        columns["valuta"],
+        columns["issuer"],
+        [map_type(tr_type) for tr_type in columns["type"]],
+        category_names(transactions, categorizer),
+        columns["description"],
+        np.abs(amounts) if cents else np.abs(amounts) / 100,
+        account_ids,
+    )))
+
+
+def yaffa_dataframe(statements: Iterable[BankStatement], cents: bool = False,
+                    categorizer: Optional[Categorizer] = None) -> pd.DataFrame:
+    """ Yaffa DataFrame of the transactions of all statements, e.g. of a whole folder, in one pass """
+    stores, account_ids = list(), list()
+    for statement in statements:
+        stores.append(statement_transactions(statement))
+        account_ids += [statement.account_id] * len(stores[-1])
+    return pd.DataFrame(yaffa_columns(TransactionStore.concat(stores), account_ids, cents, categorizer))
 
 
 @dataclass
@@ -40,23 +112,24 @@ class YaffaBankStatement:
     statement_date: str = ""
     statement_month: int = 0
     statement_year: int = 0
-    statement_balance: float = 0.0
-    statement_old_balance: float = 0.0
+    statement_balance: Optional[float] = None
+    statement_old_balance: Optional[float] = None
     transactions: List[YaffaTransaction] = field(default_factory=list)
     account_id: str = str()
     bank_id: str = str()
 
     @classmethod
-    def from_statement(cls, statement: BankStatement) -> 'YaffaBankStatement':
+    def from_statement(cls, statement: BankStatement,
+                       categorizer: Optional[Categorizer] = None) -> 'YaffaBankStatement':
         yf = YaffaBankStatement()
-        yf.convert_to_yaffa(statement)
+        yf.convert_to_yaffa(statement, categorizer)
         return yf
 
     @property
     def dataframe(self) -> pd.DataFrame:
         return self.to_dataframe()
 
-    def convert_to_yaffa(self, bank_statement: BankStatement):
+    def convert_to_yaffa(self, bank_statement: BankStatement, categorizer: Optional[Categorizer] = None):
         self.statement_number = bank_statement.statement_number
         self.statement_date = bank_statement.statement_date
         self.statement_month = bank_statement.statement_month
@@ -65,47 +138,57 @@ class YaffaBankStatement:
         self.statement_old_balance = bank_statement.statement_old_balance
 
         # Convert transactions
-        for transaction in bank_statement.transactions:
-            new_transaction = YaffaTransaction(
-                date=transaction.date,
-                valuta=transaction.valuta,
-                account_from=transaction.issuer,  # Changed from issuer to account_from
-                type=map_type(transaction.type),
-                org_type=transaction.type,
-                category=str(),
-                comment=transaction.description,  # Changed from description to comment
-                amount=abs(transaction.amount),
-                account_to=bank_statement.account_id  # Always set BankStatement.account_id in that field
-            )
-            self.transactions.append(new_transaction)
+        categories = category_names(bank_statement.transactions, categorizer)
+        for transaction, category in zip(bank_statement.transactions, categories):
+            self.transactions.append(YaffaTransaction.from_transaction(transaction, bank_statement.account_id,
+                                                                       category=category))
 
         self.account_id = bank_statement.account_id
         self.bank_id = bank_statement.bank_id
 
 
     def to_dataframe(self) -> pd.DataFrame:
-        # Create a list of dictionaries from the transactions
-        transaction_list = [
-            {
-                "date": transaction.date,
-                "valuta": transaction.valuta,
-                "account_from": transaction.account_from,
-                "type": transaction.type,
-                "category": transaction.category,
-                "comment": transaction.comment,
-                "amount": transaction.amount,
-                "account_to": transaction.account_to
-            }
-            for transaction in self.transactions
-        ]
-
-        # Convert the list of dictionaries to a DataFrame
-        return pd.DataFrame(transaction_list)
-
-
-def convert_to_yaffa(statements: List[BankStatement]) -> List[YaffaBankStatement]:
-    return [convert_statement_to_yaffa(s) for s in statements]
-
-
-def convert_statement_to_yaffa(statement: BankStatement) -> YaffaBankStatement:
-    return YaffaBankStatement.from_statement(statement)
+        return pd.DataFrame.from_records([transaction.to_row() for transaction in self.transactions],
+                                         columns=YAFFA_COLUMNS)
+
+
+def convert_to_yaffa(statements: List[BankStatement],
+                     categorizer: Optional[Categorizer] = None) -> List[YaffaBankStatement]:
+    return [convert_statement_to_yaffa(s, categorizer) for s in statements]
+
+
+def convert_statement_to_yaffa(statement: BankStatement,
+                               categorizer: Optional[Categorizer] = None) -> YaffaBankStatement:
+    return YaffaBankStatement.from_statement(statement, categorizer)
+
+
+def iter_yaffa_transactions(statements: Iterable[BankStatement], cents: bool = False,
+                            categorizer: Optional[Categorizer] = None) -> Iterator[YaffaTransaction]:
+    """ Convert transactions one by one, IngStatements are parsed while iterating """
+    for statement in statements:
+        for transaction in statement.iter_transactions():
+            rule = categorizer.match_transaction(transaction) if categorizer else None
+            # -- account_id is parsed from the header before the first transaction
+            yield YaffaTransaction.from_transaction(transaction, statement.account_id, cents,
+                                                    rule.name if rule else str())
+
+
+def write_yaffa_csv(out_file: Union[str, Path], statements: Iterable[BankStatement], cents: bool = False,
+                    categorizer: Optional[Categorizer] = None) -> int:
+    """ Stream the transactions of statements into a Yaffa CSV file, converted statement by statement """
+    rows = (row for statement in statements for row in _statement_rows(statement, cents, categorizer))
+    return write_csv_rows(out_file, YAFFA_COLUMNS, rows, delimiter=";", quoting=csv.QUOTE_ALL)
+
+
+def export_yaffa(out_file: Union[str, Path], statements: Iterable[BankStatement], fmt: str = "csv",
+                 compression: Optional[str] = None, cents: bool = False,
+                 categorizer: Optional[Categorizer] = None) -> List[Path]:
+    """ Write the Yaffa transactions of statements in any format of writer.OUTPUT_FORMATS """
+    df = yaffa_dataframe(statements, cents, categorizer)
+    return write_dataframe(df, out_file, fmt, compression=compression, **(CSV_OPTIONS if fmt == "csv" else {}))
+
+
+def _statement_rows(statement: BankStatement, cents: bool, categorizer: Optional[Categorizer]) -> Iterator[tuple]:
+    transactions = statement_transactions(statement)
+    columns = yaffa_columns(transactions, [statement.account_id] * len(transactions), cents, categorizer)
+    return column_rows(columns)
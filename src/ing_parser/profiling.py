@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union, ContextManager
+
+
+@dataclass
+class StageRecord:
+    stage: str
+    file: str
+    start: float
+    wall: float
+    cpu: Optional[float] = None
+    pid: int = 0
+    tid: int = 0
+    args: Dict[str, Union[int, float, str]] = field(default_factory=dict)
+
+
+@dataclass
+class FileProfile:
+    file: str
+    pages: int = 0
+    pages_extracted: int = 0
+    lines: int = 0
+    transactions: int = 0
+    records: List[StageRecord] = field(default_factory=list)
+
+    @property
+    def wall(self) -> float:
+        return sum(r.wall for r in self.records if r.stage in FILE_STAGES)
+
+
+# -- Stages that do not overlap and add up to the time spent on a file
+FILE_STAGES = ("cache_lookup", "cache_restore", "open", "extract_text", "header", "classify", "transactions",
+               "cache_store")
+
+
+class Profiler:
+    def __init__(self):
+        """
+        Opt-in instrumentation of the parser. Records wall and CPU time per file and stage together with page,
+        line and transaction counts. FileProfiles of worker processes are picklable and merged with add_file.
+
+        Sub-stages of the line parser (header, classify, transactions) only record accumulated wall time,
+        as reading the CPU clock per line would distort the measurement.
+        """
+        self.files: Dict[str, FileProfile] = dict()
+        self.records: List[StageRecord] = list()
+        self._lock = threading.Lock()
+
+    def file(self, file: Union[str, Path]) -> FileProfile:
+        with self._lock:
+            return self.files.setdefault(str(file), FileProfile(str(file)))
+
+    def add_file(self, profile: FileProfile):
+        with self._lock:
+            self.files[profile.file] = profile
+
+    @contextmanager
+    def stage(self, stage: str, file: Union[str, Path, None] = None, **args) -> Iterator[None]:
+        """ Record wall and CPU time of the enclosed block, file level if a file is given """
+        start, wall, cpu = time.time(), time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            record = StageRecord(stage, str(file or ""), start, time.perf_counter() - wall, time.thread_time() - cpu,
+                                 os.getpid(), threading.get_ident(), args)
+            if file is None:
+                with self._lock:
+                    self.records.append(record)
+            else:
+                self.file(file).records.append(record)
+
+    def all_records(self) -> List[StageRecord]:
+        return self.records + [r for p in self.files.values() for r in p.records]
+
+    def stage_totals(self) -> Dict[str, Dict[str, float]]:
+        totals = defaultdict(lambda: {"count": 0, "wall": 0.0, "cpu": 0.0})
+        for record in self.all_records():
+            total = totals[record.stage]
+            total["count"] += 1
+            total["wall"] += record.wall
+            total["cpu"] += record.cpu or 0.0
+        return dict(totals)
+
+    def summary(self, slowest: int = 5) -> str:
+        rows = [f"{'stage':<16}{'count':>8}{'wall [s]':>12}{'cpu [s]':>12}"]
+        for stage, total in self.stage_totals().items():
+            rows.append(f"{stage:<16}{total['count']:>8}{total['wall']:>12.4f}{total['cpu']:>12.4f}")
+
+        profiles = self.files.values()
+        rows.append(f"{len(profiles)} files, {sum(p.pages_extracted for p in profiles)}/"
+                    f"{sum(p.pages for p in profiles)} pages extracted, {sum(p.lines for p in profiles)} lines, "
+                    f"{sum(p.transactions for p in profiles)} transactions")
+
+        if profiles:
+            rows.append("Slowest files:")
+            for p in sorted(profiles, key=lambda p: p.wall, reverse=True)[:slowest]:
+                rows.append(f"  {p.wall:8.4f}s {p.pages_extracted}/{p.pages} pages "
+                            f"{p.transactions:>5} transactions {Path(p.file).name}")
+        return "\n".join(rows)
+
+    def trace_events(self) -> List[dict]:
+        """ Chrome trace event format, viewable with chrome://tracing or Perfetto """
+        events = list()
+        for record in self.all_records():
+            args = {"file": record.file, **record.args}
+            if record.cpu is not None:
+                args["cpu_ms"] = record.cpu * 1000
+            events.append({"name": record.stage, "cat": "ing_parser", "ph": "X", "ts": record.start * 1e6,
+                           "dur": record.wall * 1e6, "pid": record.pid, "tid": record.tid, "args": args})
+        return events
+
+    def to_dict(self) -> dict:
+        return {
+            "stages": self.stage_totals(),
+            "files": [{k: v for k, v in asdict(p).items() if k != "records"} | {"wall": p.wall}
+                      for p in self.files.values()],
+            "traceEvents": self.trace_events(),
+        }
+
+    def write_json(self, out_file: Union[str, Path]):
+        with open(out_file, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+
+
+class StageTimer:
+    """ Wraps a callable and accumulates its wall time and number of calls """
+    def __init__(self, func):
+        self.func = func
+        self.wall = 0.0
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            self.wall += time.perf_counter() - start
+            self.calls += 1
+
+
+def profile_stage(profiler: Optional[Profiler], stage: str, file: Union[str, Path, None] = None,
+                  **args) -> ContextManager:
+    """ Profiler.stage or a no-op if profiling is disabled """
+    if profiler is None:
+        return nullcontext()
+    return profiler.stage(stage, file, **args)
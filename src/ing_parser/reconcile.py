@@ -0,0 +1,122 @@
+import json
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List, Iterable, Optional, Union, Dict
+
+import numpy as np
+
+from ing_parser.data import BankStatement, TransactionStore
+
+# -- Check names as written to the report
+BALANCE = "balance"
+DATE_ORDER = "date_order"
+NUMBER_SEQUENCE = "number_sequence"
+BALANCE_CHAIN = "balance_chain"
+
+
+@dataclass
+class ReconciliationIssue:
+    check: str
+    account_id: str
+    statement_year: int
+    statement_number: int
+    message: str
+    expected: Optional[Union[int, str]] = None
+    actual: Optional[Union[int, str]] = None
+
+
+def to_cents(value) -> Optional[int]:
+    """ Balance in cents, None if the header value was not parsed """
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return round(value * 100)
+
+
+def _issue(check: str, statement: BankStatement, message: str, expected=None, actual=None) -> ReconciliationIssue:
+    return ReconciliationIssue(check, statement.account_id, statement.statement_year, statement.statement_number,
+                               message, expected, actual)
+
+
+def reconcile_statements(statements: Iterable[BankStatement]) -> List[ReconciliationIssue]:
+    """ Check parsed statements against their own headers and against each other.
+
+        balance: old balance + sum of the amounts equals the new balance, exact to the cent.
+        date_order: booking dates of a statement never decrease.
+        number_sequence: statement numbers of an IBAN have no gaps, numbering restarts at 1 every year.
+        balance_chain: the old balance of a statement is the new balance of the previous one.
+
+        Amounts of all statements are checked in one vectorised pass.
+    """
+    statements = list(statements)
+    issues = list()
+    if not statements:
+        return issues
+
+    stores = [s.transactions if isinstance(s.transactions, TransactionStore) else TransactionStore(s.transactions)
+              for s in statements]
+    counts = np.fromiter((len(store) for store in stores), dtype=np.int64, count=len(stores))
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    owner = np.repeat(np.arange(len(stores)), counts)
+
+    cents = np.concatenate([np.array(store.cents, dtype=np.int64) for store in stores])
+    cumulative = np.concatenate(([0], np.cumsum(cents)))
+    sums = cumulative[offsets[1:]] - cumulative[offsets[:-1]]
+
+    headers = [(to_cents(s.statement_old_balance), to_cents(s.statement_balance)) for s in statements]
+    parsed = np.array([None not in header for header in headers])
+    old_balances, balances = np.array([h if None not in h else (0, 0) for h in headers], dtype=np.int64).T
+    differences = balances - old_balances - sums
+
+    for idx in np.flatnonzero(~parsed):
+        issues.append(_issue(BALANCE, statements[idx], "Old or new balance missing in the statement header"))
+    for idx in np.flatnonzero(parsed & (differences != 0)):
+        issues.append(_issue(BALANCE, statements[idx], f"Old balance plus {counts[idx]} transactions differs from "
+                                                       f"the new balance by {differences[idx]} cents",
+                             int(balances[idx]), int(old_balances[idx] + sums[idx])))
+
+    dates = np.array([d[:10] for store in stores for d in store.dates], dtype="U10")
+    # -- A decrease is only an issue within the same statement
+    decreasing = np.flatnonzero((dates[1:] < dates[:-1]) & (owner[1:] == owner[:-1])) + 1
+
+    for position in decreasing:
+        statement = statements[owner[position]]
+        row = position - offsets[owner[position]]
+        issues.append(_issue(DATE_ORDER, statement, f"Transaction {row} is booked before the previous one",
+                             str(dates[position - 1]), str(dates[position])))
+
+    issues += _check_sequence(statements)
+    return issues
+
+
+def _check_sequence(statements: List[BankStatement]) -> List[ReconciliationIssue]:
+    issues = list()
+    accounts: Dict[str, List[BankStatement]] = dict()
+    for statement in statements:
+        accounts.setdefault(statement.account_id, list()).append(statement)
+
+    for account_statements in accounts.values():
+        account_statements.sort(key=lambda s: (s.statement_year, s.statement_number))
+        for previous, statement in zip(account_statements, account_statements[1:]):
+            if statement.statement_year == previous.statement_year:
+                expected = previous.statement_number + 1
+            else:
+                expected = 1 if statement.statement_year == previous.statement_year + 1 else None
+            if expected is None or statement.statement_number != expected:
+                issues.append(_issue(NUMBER_SEQUENCE, statement,
+                                     f"Statement follows {previous.statement_year}/{previous.statement_number}",
+                                     expected, statement.statement_number))
+
+            old_balance, previous_balance = to_cents(statement.statement_old_balance), \
+                to_cents(previous.statement_balance)
+            if None not in (old_balance, previous_balance) and old_balance != previous_balance:
+                issues.append(_issue(BALANCE_CHAIN, statement,
+                                     f"Old balance differs from the new balance of statement "
+                                     f"{previous.statement_year}/{previous.statement_number}",
+                                     previous_balance, old_balance))
+    return issues
+
+
+def write_report(out_file: Union[str, Path], issues: List[ReconciliationIssue], num_statements: int):
+    report = {"statements": num_statements, "issues": [asdict(issue) for issue in issues]}
+    with open(out_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
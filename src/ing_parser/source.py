@@ -0,0 +1,78 @@
+import io
+import mmap
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Union, BinaryIO, Iterator, Optional
+
+# -- A statement can be read from a path, PDF content in memory or an open binary file
+PdfSource = Union[str, Path, bytes, bytearray, memoryview, BinaryIO]
+PdfData = Union[bytes, bytearray, memoryview, BinaryIO]
+# -- Smaller files are read in one call, the PDF reader's many small reads are faster on an in-memory buffer
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+
+class BufferStream(io.RawIOBase):
+    """ Read-only seekable stream over a bytes-like object, only the requested slices are copied """
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview]):
+        super().__init__()
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._pos + size)
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def is_path(source: PdfSource) -> bool:
+    return isinstance(source, (str, Path))
+
+
+def source_data(source: PdfData) -> PdfData:
+    """ In-memory data as is, file objects that can not seek are read into memory as the PDF reader needs to seek """
+    if hasattr(source, "read") and not (hasattr(source, "seekable") and source.seekable()):
+        return source.read()
+    return source
+
+
+@contextmanager
+def open_pdf_stream(source_file: Path, data: Optional[PdfData] = None) -> Iterator[BinaryIO]:
+    """ Seekable stream of the PDF content without copying in-memory data.
+        Local files from MMAP_THRESHOLD bytes on are memory-mapped instead of read into memory.
+    """
+    if data is None:
+        with open(source_file, "rb") as f:
+            if os.fstat(f.fileno()).st_size < MMAP_THRESHOLD:
+                yield io.BytesIO(f.read())
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+    elif hasattr(data, "read"):
+        yield data
+    elif isinstance(data, bytes):
+        # -- BytesIO shares the bytes object until it is written to
+        yield io.BytesIO(data)
+    else:
+        yield BufferStream(data)
@@ -1,53 +1,124 @@
+from __future__ import annotations
+
 import logging
+import os
+import re
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import fields
 from pathlib import Path
-from typing import Union, List
-
-import pandas as pd
-from pypdf import PdfReader
+from typing import Union, List, Iterable, Optional, Iterator, Dict, TYPE_CHECKING
 
 from ing_parser.base import IngBase
-from ing_parser.data import BankStatement, Transaction, to_iso_date
+from ing_parser.cache import StatementCache, file_hash, data_hash
+from ing_parser.data import BankStatement, Transaction, TransactionStore, to_iso_date, parse_cents
+from ing_parser.profiling import Profiler, StageRecord, StageTimer, profile_stage
+from ing_parser.source import PdfSource, PdfData, is_path, source_data, open_pdf_stream
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+DATAFRAME_COLUMNS = ('date', 'valuta', 'issuer', 'type', 'description', 'amount')
+
+
+def transactions_to_dataframe(transactions: Iterable[Transaction], cents: bool = False) -> pd.DataFrame:
+    """Create a Pandas DataFrame from BankStatement Transaction data.
+
+    Builds typed columns in a single pass: dates are converted with one vectorised datetime64 conversion
+    per column, amounts are float64 and the transaction type is categorical.
+    With cents, amounts are exact int64 cents instead, so aggregations do not drift.
+    A TransactionStore is converted from its columns directly.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if not isinstance(transactions, TransactionStore):
+        transactions = TransactionStore(transactions)
+    dates, valutas, issuers, types, descriptions, amounts = transactions.columns().values()
+    amounts = np.frombuffer(amounts, dtype=np.int64) if len(amounts) else np.zeros(0, dtype=np.int64)
+
+    return pd.DataFrame({
+        'date': pd.to_datetime(dates, format="ISO8601", errors="coerce"),
+        'valuta': pd.to_datetime(valutas, format="ISO8601", errors="coerce"),
+        'issuer': pd.Series(issuers, dtype=object),
+        'type': pd.Categorical(types),
+        'description': pd.Series(descriptions, dtype=object),
+        'amount': amounts.copy() if cents else amounts / 100,
+    }, columns=DATAFRAME_COLUMNS)
+
+
+def amounts_in_cents(df: pd.DataFrame) -> pd.DataFrame:
+    """ Convert the float amount column of a transaction DataFrame to exact int64 cents """
+    import numpy as np
+    return df.assign(amount=np.rint(df["amount"].to_numpy() * 100).astype(np.int64))
+
+
+def add_statement_year(df: pd.DataFrame, statements: List[BankStatement]) -> pd.DataFrame:
+    """ Add the statement_year column to a DataFrame built from the transactions of statements, in their order """
+    import numpy as np
+    years = np.repeat([s.statement_year for s in statements], [len(s.transactions) for s in statements])
+    return df.assign(statement_year=years.astype(np.int16))
 
 
 class IngStatement(IngBase, BankStatement):
 
-    def __init__(self, source_file: Union[str, Path]):
+    def __init__(self, source_file: PdfSource, cache: Optional[StatementCache] = None,
+                 skip_info_pages: bool = True, profiler: Optional[Profiler] = None, name: Optional[str] = None,
+                 strict: bool = False):
         """
         Parses a given bank statement PDF file and returns its contents as a pandas DataFrame.
+        source_file is a path, which is memory-mapped while reading, or the PDF content as bytes, memoryview
+        or binary file object e.g. of an upload. In-memory content is read in place without temporary files,
+        name is then used for logging and profiling.
+        If a StatementCache is provided, unchanged files are restored from the cache instead of re-parsing the PDF.
+        With skip_info_pages, pages following the closing balance 'Neuer Saldo' are not extracted as they
+        only contain notices and never bookings. Extraction time per page is kept in page_timings.
+        An optional Profiler records time per parsing stage together with page, line and transaction counts.
+        PDF files that cannot be opened are logged and parse to an empty statement, with strict the error is raised.
 
         dataframe:
             pd.DataFrame: A DataFrame containing the parsed data from the bank statement PDF file.
 
             The DataFrame has six columns:
-                'date' (datetime), 'valuta' (datetime), 'issuer' (str), 'type' (str)
+                'date' (datetime), 'valuta' (datetime), 'issuer' (str), 'type' (category)
                 'description' (str), and 'amount' (float).
+            It is built once and kept until the statement is parsed again.
         """
         super().__init__()
+        self.source_data: Optional[PdfData] = None
+        if not is_path(source_file):
+            self.source_data = source_data(source_file)
+            source_file = name or getattr(source_file, "name", None) or "<memory>"
         self.source_file = Path(source_file)
-        self._rows = dict()
+        self.cache = cache
+        self.skip_info_pages = skip_info_pages
+        self.page_timings: List[float] = list()
+        # -- Pages of the PDF and text lines the statement was parsed from, also kept with cached statements
+        self.page_count = 0
+        self.line_count = 0
+        self.profiler = profiler
+        self.strict = strict
         self._parsed = False
+        self._df: Optional[pd.DataFrame] = None
 
     def _to_pandas_df(self) -> pd.DataFrame:
         """Create a Pandas DataFrame from the BankStatement Transaction data."""
-        transactions_data = []
-        for transaction in self.transactions:
-            date_str = pd.to_datetime(transaction.date)
-            valuta_str = pd.to_datetime(transaction.valuta)
-            issuer_str = transaction.issuer
-            type_str = transaction.type
-            description_str = transaction.description
-            amount = transaction.amount
-
-            transactions_data.append([date_str, valuta_str, issuer_str, type_str, description_str, amount])
+        return transactions_to_dataframe(self.transactions)
 
-        # Convert list of lists to DataFrame
-        return pd.DataFrame(transactions_data, columns=['date', 'valuta', 'issuer', 'type', 'description', 'amount'])
+    def to_bank_statement(self) -> BankStatement:
+        """ Return the parsed data as a plain, picklable BankStatement without reader state """
+        return BankStatement(**{f.name: getattr(self, f.name) for f in fields(BankStatement)})
 
     @property
     def dataframe(self) -> pd.DataFrame:
-        if not len(self.transactions):
-            self._auto_parse_ing_bank_statement()
-        return self._to_pandas_df()
+        if self._df is None:
+            if not len(self.transactions):
+                self._auto_parse_ing_bank_statement()
+            with profile_stage(self.profiler, "dataframe", self.source_file):
+                self._df = self._to_pandas_df()
+        return self._df
 
     def _auto_parse_ing_bank_statement(self):
         """ Meant to not reparse on every call to properties """
@@ -56,86 +127,212 @@ class IngStatement(IngBase, BankStatement):
         self._parsed = True
         self.parse_ing_bank_statement()
 
+    def set_transactions(self, transactions: Iterable[Transaction]):
+        super().set_transactions(transactions)
+        # -- The memoised DataFrame was built from the previous transactions
+        self._df = None
+
     def parse_ing_bank_statement(self):
         self.clear_transactions()
-        self._rows = {"date": [], "valuta": [], "issuer": [], "type": [], "description": [], "amount": []}
+        self._df = None
+        for transaction in self._iter_parse():
+            self.add_transaction(transaction)
+        self._parsed = True
+
+    def iter_transactions(self) -> Iterator[Transaction]:
+        """ Yield the transactions page by page while the PDF text is extracted, without storing them.
+            Header fields are set on this statement as they are parsed.
+        """
+        if self._parsed:
+            yield from self.transactions
+            return
+        yield from self._iter_parse()
+
+    def _iter_parse(self) -> Iterator[Transaction]:
+        with profile_stage(self.profiler, "cache_lookup", self.source_file):
+            content_hash = self._content_hash()
+            cached = self.cache.get_statement_counts(content_hash, self._extraction_variant()) if content_hash \
+                else None
 
-        skip_next_line = False
-        lines = self._read_pdf()
+        if cached is not None:
+            statement, counts = cached
+            with profile_stage(self.profiler, "cache_restore", self.source_file):
+                self._set_header_fields(statement)
+                self.page_count, self.line_count = counts.get("pages", 0), counts.get("lines", 0)
+            if self.profiler:
+                profile = self.profiler.file(self.source_file)
+                profile.pages, profile.lines = self.page_count, self.line_count
+                profile.transactions = len(statement.transactions)
+            logging.debug(f"Restored {self.source_file.name} from statement cache")
+            yield from statement.transactions
+            return
+
+        # -- Only collected if they need to be stored in the cache
+        parsed = TransactionStore() if content_hash else None
+        timers = self._instrument_parser() if self.profiler else None
+        try:
+            for transaction in self._parse_lines(self._iter_lines(content_hash)):
+                if parsed is not None:
+                    parsed.append(transaction)
+                yield transaction
+        finally:
+            # -- Also restores the parser methods if the iterator is abandoned
+            if timers:
+                self._record_parser_timers(timers)
 
-        for idx, line in enumerate(lines):
-            self._parse_statement_fields(line, self)
-            if skip_next_line:
-                skip_next_line = False
+        if content_hash:
+            with profile_stage(self.profiler, "cache_store", self.source_file):
+                statement = self.to_bank_statement()
+                statement.transactions = parsed
+                self.cache.put_statement(content_hash, statement, self._extraction_variant(),
+                                         {"pages": self.page_count, "lines": self.line_count})
+
+    def _instrument_parser(self) -> Dict[str, StageTimer]:
+        """ Shadow the line parser methods on this instance with timed versions """
+        start = time.time()
+        timers = {"header": StageTimer(self._parse_header_line), "classify": StageTimer(self._classify_line),
+                  "transactions": StageTimer(self._parse_transaction_line)}
+        self._parse_header_line, self._classify_line, self._parse_transaction_line = timers.values()
+        self._parser_start = start
+        return timers
+
+    def _record_parser_timers(self, timers: Dict[str, StageTimer]):
+        del self._parse_header_line, self._classify_line, self._parse_transaction_line
+
+        profile = self.profiler.file(self.source_file)
+        profile.lines = timers["classify"].calls
+        profile.transactions = timers["transactions"].calls
+        for stage, timer in timers.items():
+            profile.records.append(StageRecord(stage, str(self.source_file), self._parser_start, timer.wall,
+                                               pid=os.getpid(), tid=threading.get_ident(), args={"calls": timer.calls}))
+
+    def _parse_lines(self, lines: Iterable[str]) -> Iterator[Transaction]:
+        transaction: Optional[Transaction] = None
+        first_description_line = False
+        description_lines = 0
+        missing_fields = set(self.get_regex_fields())
+
+        for line in lines:
+            if missing_fields:
+                self._parse_header_line(line, self, missing_fields)
+
+            kind, match = self._classify_line(line)
+            if first_description_line:
+                # -- The line following a transaction contains Valuta and description
+                first_description_line = False
+                self._parse_first_description_line(line, match, transaction)
                 continue
 
-            if self._parse_transaction_line(line):
-                # -- Did the previous line contained a valid entry
-                #    then read the following line with transaction description
-                self._parse_description(lines, idx)
-                skip_next_line = True
+            if transaction is not None and (kind != self._LINE_TEXT or description_lines >= self._MAX_DESC_LINES
+                                            or not line.strip() or line.startswith(self._END_OF_BOOKINGS)):
+                # -- Date found, new entry, description complete or ended by a page break or the closing balance
+                yield transaction
+                transaction = None
 
-        # -- Store transactions data
-        for idx in range(len(self._rows['date'])):
-            data = {k: v[idx] for k, v in self._rows.items()}
-            self.add_transaction(Transaction(**data))
+            if kind == self._LINE_TRANSACTION:
+                transaction = self._parse_transaction_line(match)
+                first_description_line = True
+                description_lines = 0
+            elif transaction is not None:
+                # -- Parse additional description lines
+                transaction.description += "\n" + line.strip()
+                description_lines += 1
 
-    def _read_pdf(self) -> List[str]:
-        lines = list()
+        if transaction is not None:
+            yield transaction
+
+    def _content_hash(self) -> Optional[str]:
+        if self.cache is None:
+            return None
         try:
-            reader = PdfReader(self.source_file)
-        except Exception as e:
-            logging.error(f"Error reading file while trying to parse statement: {e}")
-            return lines
+            return data_hash(self.source_data) if self.source_data is not None else file_hash(self.source_file)
+        except OSError as e:
+            logging.error(f"Error hashing file {self.source_file}, not using cache: {e}")
+            return None
+
+    def _set_header_fields(self, statement: BankStatement):
+        for f in fields(BankStatement):
+            if f.name != "transactions":
+                setattr(self, f.name, getattr(statement, f.name))
+
+    def _iter_lines(self, content_hash: Optional[str]) -> Iterator[str]:
+        """ Yield the PDF text lines, from the cache if available """
+        if content_hash is None:
+            yield from self._iter_pdf_lines()
+            return
 
-        for page in reader.pages:
-            content = page.extract_text(0)
-            lines += content.split("\n")
+        variant = self._extraction_variant()
+        lines = self.cache.get_lines(content_hash, variant)
+        if lines is not None:
+            self.line_count = len(lines)
+            yield from lines
+            return
+
+        lines = list()
+        for line in self._iter_pdf_lines():
+            lines.append(line)
+            yield line
+        self.line_count = len(lines)
+        if lines:
+            self.cache.put_lines(content_hash, lines, variant)
+
+    def _read_pdf(self) -> List[str]:
+        return list(self._iter_pdf_lines())
+
+    def _extraction_variant(self) -> str:
+        return "statement_pages" if self.skip_info_pages else "all_pages"
 
-        return lines
+    def _iter_pdf_lines(self) -> Iterator[str]:
+        """ Yield text lines page by page as they are extracted """
+        # -- Imported on first extraction, statements restored from the cache never load pypdf
+        from pypdf import PdfReader
 
-    def _parse_transaction_line(self, line: str) -> bool:
-        """ Parse data belonging to transactions """
-        amount = self._AMOUNT_REGEX.search(line)
-        if amount is None:
-            return False
+        self.page_timings = list()
+        with ExitStack() as stack:
+            try:
+                with profile_stage(self.profiler, "open", self.source_file):
+                    reader = PdfReader(stack.enter_context(open_pdf_stream(self.source_file, self.source_data)))
+            except Exception as e:
+                if self.strict:
+                    raise
+                logging.error(f"Error reading file while trying to parse statement: {e}")
+                return
+
+            for page_idx, page in enumerate(reader.pages):
+                start = time.perf_counter()
+                with profile_stage(self.profiler, "extract_text", self.source_file, page=page_idx):
+                    lines = page.extract_text(0).split("\n")
+                self.page_timings.append(time.perf_counter() - start)
+                self.page_count = len(reader.pages)
+
+                if self.profiler:
+                    profile = self.profiler.file(self.source_file)
+                    profile.pages, profile.pages_extracted = len(reader.pages), len(self.page_timings)
+                yield from lines
 
-        date = self._DATE_REGEX.search(line)
-        if date is None:
-            return False
+                if self.skip_info_pages and any(line.startswith(self._END_OF_BOOKINGS) for line in lines):
+                    break
 
-        date_string = date.group(0)
-        amount = amount.group(0)
-        line_wo_date = line[len(date_string): -len(amount)].strip()
+            logging.debug(f"Extracted {len(self.page_timings)}/{len(reader.pages)} pages of {self.source_file.name} "
+                          f"in {sum(self.page_timings):.3f}s")
+
+    @staticmethod
+    def _parse_transaction_line(match: re.Match) -> Transaction:
+        """ Parse data belonging to transactions from a classified transaction line """
+        line_wo_date = match.group("text").strip()
 
         tr_type = line_wo_date[:line_wo_date.find(" ") if line_wo_date.find(" ") > -1 else 0]
         issuer = line_wo_date[len(tr_type):].strip()
 
-        amount = float(amount.replace(".", "").replace(",", "."))
-        self._rows["date"].append(to_iso_date(date_string))
-        self._rows["amount"].append(amount)
-        self._rows["issuer"].append(issuer)
-        self._rows["type"].append(tr_type)
+        amount = parse_cents(match.group("amount")) / 100
 
         # The following line belongs to this entry
-        return True
-
-    def _parse_description(self, lines, current_idx):
-        # -- Parse first description line including Valuta
-        self._parse_first_description_line(lines[current_idx + 1])
+        return Transaction(date=to_iso_date(match.group("date")), valuta=str(), issuer=issuer, type=tr_type,
+                           description=str(), amount=amount)
 
-        # -- Parse additional description lines
-        for idx, line in enumerate(lines[current_idx + 2:]):
-            date = self._DATE_REGEX.search(line)
-            # -- Date found, new entry, abort
-            if date is not None or idx >= self._MAX_DESC_LINES:
-                return
-            self._rows["description"][-1] += "\n" + line.strip()
-
-    def _parse_first_description_line(self, line):
-        valuta = self._DATE_REGEX.search(line)
-        if valuta is not None:
-            valuta = valuta.group(0)
-            description = line[len(valuta):].strip()
-            self._rows["valuta"].append(to_iso_date(valuta))
-            self._rows["description"].append(description)
+    @staticmethod
+    def _parse_first_description_line(line: str, match: Optional[re.Match], transaction: Transaction):
+        if match is not None:
+            valuta = match.group("date")
+            transaction.description = line[len(valuta):].strip()
+            transaction.valuta = to_iso_date(valuta)
@@ -0,0 +1,150 @@
+import logging
+import sqlite3
+from contextlib import contextmanager
+from dataclasses import fields
+from pathlib import Path
+from typing import Union, Optional, List, Iterable, Iterator, Tuple
+
+import pandas as pd
+
+from ing_parser.data import BankStatement, Transaction, TransactionStore
+from ing_parser.statement import transactions_to_dataframe
+
+DEFAULT_DB_FILE = "ing_transactions.sqlite"
+# -- Tables of an older schema are dropped, the database is rebuilt from the statements
+SCHEMA_VERSION = 2
+
+_HEADER_FIELDS = tuple(f.name for f in fields(BankStatement) if f.name != "transactions")
+_KEY_FIELDS = ("account_id", "statement_year", "statement_number")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS statements ("
+    "account_id TEXT NOT NULL, statement_year INTEGER NOT NULL, statement_number INTEGER NOT NULL, "
+    "statement_month INTEGER, statement_date TEXT, statement_balance REAL, statement_old_balance REAL, bank_id TEXT, "
+    "PRIMARY KEY (account_id, statement_year, statement_number))",
+    "CREATE TABLE IF NOT EXISTS transactions ("
+    "account_id TEXT NOT NULL, statement_year INTEGER NOT NULL, statement_number INTEGER NOT NULL, "
+    "position INTEGER NOT NULL, date TEXT NOT NULL, valuta TEXT, issuer TEXT, type TEXT, description TEXT, "
+    "cents INTEGER NOT NULL, PRIMARY KEY (account_id, statement_year, statement_number, position)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS transactions_date ON transactions (date)",
+    "CREATE INDEX IF NOT EXISTS transactions_type_date ON transactions (type, date)",
+    "CREATE INDEX IF NOT EXISTS transactions_issuer_date ON transactions (issuer, date)",
+    "CREATE INDEX IF NOT EXISTS transactions_account_date ON transactions (account_id, date)",
+)
+
+
+class TransactionDatabase:
+    def __init__(self, db_file: Union[str, Path] = DEFAULT_DB_FILE):
+        """
+        Indexed SQLite storage of parsed statements, to query transactions without parsing the PDF files again.
+
+        Statements are keyed by IBAN (account_id), statement year and statement number, as ING restarts
+        the statement numbers every year. Transactions keep their position within the statement and are
+        indexed by date, type and issuer. Amounts are stored as integer cents, so SUM is exact.
+        """
+        self.db_file = Path(db_file)
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            if con.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                con.execute("DROP TABLE IF EXISTS transactions")
+                con.execute("DROP TABLE IF EXISTS statements")
+                con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            for statement in _SCHEMA:
+                con.execute(statement)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(self.db_file, timeout=30)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+
+    def upsert_statements(self, statements: Iterable[BankStatement]) -> int:
+        """ Insert or replace statements with all their transactions in one transaction, returns the row count """
+        num_rows = 0
+        columns = ", ".join(_HEADER_FIELDS)
+        updates = ", ".join(f"{f} = excluded.{f}" for f in _HEADER_FIELDS if f not in _KEY_FIELDS)
+        with self._connect() as con:
+            for statement in statements:
+                key = tuple(getattr(statement, f) for f in _KEY_FIELDS)
+                if not key[0]:
+                    logging.error(f"Not storing statement {statement.statement_number} without account_id")
+                    continue
+
+                con.execute(f"INSERT INTO statements ({columns}) VALUES ({', '.join('?' * len(_HEADER_FIELDS))}) "
+                            f"ON CONFLICT (account_id, statement_year, statement_number) DO UPDATE SET {updates}",
+                            tuple(getattr(statement, f) for f in _HEADER_FIELDS))
+                con.execute("DELETE FROM transactions WHERE account_id = ? AND statement_year = ? "
+                            "AND statement_number = ?", key)
+                con.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                (key + (position, t.date, t.valuta, t.issuer, t.type, t.description, t.cents)
+                                 for position, t in enumerate(statement.transactions)))
+                num_rows += len(statement.transactions)
+        return num_rows
+
+    def transactions(self, account_id: Optional[str] = None, type: Optional[str] = None,
+                     issuer: Optional[str] = None, year: Optional[int] = None, date_from: Optional[str] = None,
+                     date_to: Optional[str] = None, search: Optional[str] = None,
+                     limit: Optional[int] = None) -> TransactionStore:
+        """ Transactions matching all given filters, ordered by date.
+
+            type and issuer match exactly, date_from and date_to are inclusive ISO dates and search is a
+            case-insensitive substring of issuer or description.
+        """
+        where, params = self._where(account_id, type, issuer, year, date_from, date_to, search)
+        sql = f"SELECT date, valuta, issuer, type, description, cents FROM transactions {where} " \
+              f"ORDER BY date, account_id, statement_year, statement_number, position"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+
+        with self._connect() as con:
+            return TransactionStore(Transaction(*row[:5], row[5] / 100) for row in con.execute(sql, params))
+
+    def dataframe(self, cents: bool = False, **filters) -> pd.DataFrame:
+        """ transactions as a typed DataFrame, see transactions_to_dataframe """
+        return transactions_to_dataframe(self.transactions(**filters), cents)
+
+    def statements(self, account_id: Optional[str] = None, year: Optional[int] = None) -> List[BankStatement]:
+        """ Statement headers with their balances, without transactions """
+        where, params = self._where(account_id, statement_year=year)
+        with self._connect() as con:
+            rows = con.execute(f"SELECT {', '.join(_HEADER_FIELDS)} FROM statements {where} "
+                               f"ORDER BY account_id, statement_year, statement_number", params).fetchall()
+        return [BankStatement(**dict(zip(_HEADER_FIELDS, row))) for row in rows]
+
+    @staticmethod
+    def _where(account_id: Optional[str] = None, type: Optional[str] = None, issuer: Optional[str] = None,
+               year: Optional[int] = None, date_from: Optional[str] = None, date_to: Optional[str] = None,
+               search: Optional[str] = None, statement_year: Optional[int] = None) -> Tuple[str, list]:
+        conditions, params = list(), list()
+        if account_id:
+            conditions.append("account_id = ?")
+            params.append(account_id.replace(" ", ""))
+        if type:
+            conditions.append("type = ?")
+            params.append(type)
+        if issuer:
+            conditions.append("issuer = ?")
+            params.append(issuer)
+        if year:
+            # -- A date range instead of strftime keeps the date index usable
+            conditions.append("date >= ? AND date < ?")
+            params += [f"{year:04d}-01-01", f"{year + 1:04d}-01-01"]
+        if date_from:
+            conditions.append("date >= ?")
+            params.append(date_from[:10])
+        if date_to:
+            conditions.append("date < ?")
+            params.append(f"{date_to[:10]}T99")
+        if search:
+            conditions.append("(issuer LIKE ? OR description LIKE ?)")
+            params += [f"%{search}%"] * 2
+        if statement_year:
+            conditions.append("statement_year = ?")
+            params.append(statement_year)
+        return ("WHERE " + " AND ".join(conditions)) if conditions else str(), params
+
@@ -0,0 +1,181 @@
+import csv
+import hashlib
+import heapq
+import json
+import logging
+import os
+from collections import Counter
+from dataclasses import dataclass, field, asdict
+from operator import itemgetter
+from pathlib import Path
+from typing import Union, Dict, Iterator, List, Tuple
+
+from ing_parser.cache import file_hash
+from ing_parser.data import BankStatement
+from ing_parser.folder import IngStatementsFolder
+from ing_parser.io.writer import CSV_COLUMNS, transaction_row, write_csv_rows
+
+_row_date = itemgetter(0)
+
+
+def row_key(row: Tuple[str, ...]) -> str:
+    return hashlib.sha1("\x1f".join(row).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class ManifestEntry:
+    path: str
+    mtime: float
+    size: int
+    hash: str
+    statement_number: int = 0
+    account_id: str = str()
+    rows: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Manifest:
+    entries: Dict[str, ManifestEntry] = field(default_factory=dict)
+
+    _VERSION = 1
+
+    @classmethod
+    def load(cls, manifest_file: Path) -> 'Manifest':
+        try:
+            with open(manifest_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValueError) as e:
+            logging.error(f"Error reading manifest {manifest_file}, starting a full sync: {e}")
+            return cls()
+
+        if data.get("version") != cls._VERSION:
+            return cls()
+        return cls({e["path"]: ManifestEntry(**e) for e in data.get("files", list())})
+
+    def save(self, manifest_file: Path):
+        data = {"version": self._VERSION, "files": [asdict(e) for e in self.entries.values()]}
+        tmp_file = manifest_file.with_name(manifest_file.name + ".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_file, manifest_file)
+
+
+class IncrementalSync:
+    def __init__(self, folder: IngStatementsFolder, output_file: Union[str, Path]):
+        """
+        Keeps a CSV output of an IngStatementsFolder up to date.
+
+        A manifest next to the output records path, mtime, size, content hash, statement number, IBAN and
+        the written rows of every parsed file. Each run only parses added or changed files and merges their
+        transactions into the existing output, rows of changed or removed files are dropped.
+
+        Only the new rows are sorted. The existing output is already sorted and streamed through a single merge
+        pass into the new file, so it is never loaded or sorted in memory.
+        """
+        self.folder = folder
+        self.output_file = Path(output_file)
+        self.manifest_file = self.output_file.with_name(self.output_file.name + ".manifest.json")
+
+    def run(self) -> int:
+        """ Sync the output file, returns the number of parsed files """
+        manifest = Manifest.load(self.manifest_file) if self.output_file.exists() else Manifest()
+        if manifest.entries and not self._has_csv_header():
+            # -- The rows of the listed files cannot be kept, so all files are parsed again
+            logging.error(f"Unexpected header in {self.output_file}, rebuilding from all files")
+            manifest.entries.clear()
+        # -- Without a manifest the existing output is unknown and gets rebuilt
+        keep_output = bool(manifest.entries)
+        changed, stale = self._changed_files(manifest)
+        pdf_files = list(changed)
+
+        if not pdf_files and not stale:
+            manifest.save(self.manifest_file)
+            logging.info(f"{self.output_file.name} is up to date")
+            return 0
+
+        # -- Rows of changed or removed files
+        drop_rows = Counter(key for entry in stale for key in entry.rows)
+        new_rows = list()
+
+        for file, statement in zip(pdf_files, self.folder.parse_files(pdf_files)):
+            if statement is None:
+                # -- Failed with limits, the file has no manifest entry and is parsed again by the next run
+                continue
+            rows = [transaction_row(t) for t in statement.transactions]
+            manifest.entries[str(file)] = self._create_entry(file, changed[file], statement, rows)
+            new_rows += rows
+
+        old_rows = self._iter_output(drop_rows) if keep_output else iter(())
+        self._write_output(old_rows, new_rows)
+        manifest.save(self.manifest_file)
+
+        logging.info(f"Parsed {len(pdf_files)} new or changed and dropped {len(stale)} stale files")
+        return len(pdf_files)
+
+    def _changed_files(self, manifest: Manifest) -> Tuple[Dict[Path, str], List[ManifestEntry]]:
+        """ Returns added or changed files with their content hash and the entries of changed or removed files """
+        changed, stale = dict(), list()
+        current = set()
+
+        for file in self.folder.find_files():
+            current.add(str(file))
+            entry = manifest.entries.get(str(file))
+            stat = file.stat()
+            if entry and entry.mtime == stat.st_mtime and entry.size == stat.st_size:
+                continue
+
+            content_hash = file_hash(file)
+            if entry and entry.hash == content_hash:
+                # -- Touched but unchanged content
+                entry.mtime, entry.size = stat.st_mtime, stat.st_size
+                continue
+
+            if entry:
+                stale.append(manifest.entries.pop(str(file)))
+            changed[file] = content_hash
+
+        for path in set(manifest.entries) - current:
+            stale.append(manifest.entries.pop(path))
+
+        return changed, stale
+
+    @staticmethod
+    def _create_entry(file: Path, content_hash: str, statement: BankStatement,
+                      rows: List[Tuple[str, ...]]) -> ManifestEntry:
+        stat = file.stat()
+        return ManifestEntry(path=str(file), mtime=stat.st_mtime, size=stat.st_size, hash=content_hash,
+                             statement_number=statement.statement_number, account_id=statement.account_id,
+                             rows=[row_key(r) for r in rows])
+
+    @staticmethod
+    def _take(counter: Counter, key: str) -> bool:
+        if counter[key] > 0:
+            counter[key] -= 1
+            return True
+        return False
+
+    def _has_csv_header(self) -> bool:
+        with open(self.output_file, "r", encoding="utf-8", newline="") as f:
+            header = next(csv.reader(f, delimiter=";"), None)
+        return header is not None and tuple(header) == CSV_COLUMNS
+
+    def _iter_output(self, drop_rows: Counter) -> Iterator[List[str]]:
+        """ Rows of the existing output in their sorted order, without the rows in drop_rows.
+            The header is checked by run() before the output is kept.
+        """
+        with open(self.output_file, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f, delimiter=";")
+            next(reader, None)
+            for row in reader:
+                if not self._take(drop_rows, row_key(row)):
+                    yield row
+
+    def _write_output(self, old_rows: Iterator[List[str]], new_rows: List[Tuple[str, ...]]):
+        new_rows.sort(key=_row_date, reverse=True)
+        # -- heapq.merge is stable, existing rows of a day stay in front of new ones like in a full rebuild
+        rows = heapq.merge(old_rows, new_rows, key=_row_date, reverse=True)
+        tmp_file = self.output_file.with_name(self.output_file.name + ".tmp")
+        write_csv_rows(tmp_file, CSV_COLUMNS, rows, delimiter=";", quoting=csv.QUOTE_ALL)
+        os.replace(tmp_file, self.output_file)
@@ -0,0 +1,167 @@
+import random
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import List, Union
+
+from ing_parser.data import BankStatement, Transaction
+from ing_parser.dates import GERMAN_MONTHS
+
+ISSUERS = (
+    ("Lastschrift", "REWE Markt GmbH"), ("Lastschrift", "Stadtwerke München GmbH"),
+    ("Lastschrift", "Bäckerei Müller"),
+    ("Lastschrift", "Deutsche Telekom AG"), ("Lastschrift", "PayPal Europe S.a.r.l. et Cie S.C.A"),
+    ("Ueberweisung", "Max Mustermann"), ("Ueberweisung", "Hausverwaltung Schmidt & Co. KG"),
+    ("Dauerauftrag/Terminueberw.", "Erika Mustermann"), ("Gutschrift", "Finanzamt Berlin"),
+    ("Gehalt/Rente", "ACME Deutschland GmbH"), ("Entgelt", "ING"), ("Abbuchung", "Visa Karte"),
+    ("Retoure", "Zalando SE"),
+)
+NOTICE_LINES = (
+    "Wichtige Hinweise",
+    "Bitte erheben Sie Einwendungen gegen einzelne Buchungen unverzüglich.",
+    "Guthaben sind als Einlagen nach Maßgabe des Einlagensicherungsgesetzes entschädigungsfähig.",
+    "ING-DiBa AG · Theodor-Heuss-Allee 2 · 60486 Frankfurt am Main",
+)
+
+
+def format_amount(cents: int) -> str:
+    """ German amount format, e.g. -1.234,56 """
+    euros, rest = divmod(abs(cents), 100)
+    return f"{'-' if cents < 0 else ''}{euros:,}".replace(",", ".") + f",{rest:02d}"
+
+
+def format_date(d: date) -> str:
+    return d.strftime("%d.%m.%Y")
+
+
+def month_name(month: int) -> str:
+    return GERMAN_MONTHS[month - 1]
+
+
+@dataclass
+class SyntheticStatement:
+    """ Text pages of an ING style statement together with the BankStatement a parser should read from it """
+    statement: BankStatement
+    pages: List[List[str]] = field(default_factory=list)
+    file_name: str = str()
+
+    @property
+    def lines(self) -> List[str]:
+        return [line for page in self.pages for line in page]
+
+
+def generate_statement(year: int = 2020, month: int = 1, statement_number: int = 1, transactions: int = 30,
+                       transactions_per_page: int = 25, old_balance: int = 250000, notice_pages: int = 1,
+                       account_number: str = "5422021297", seed: int = 0) -> SyntheticStatement:
+    """ Generate the text of a monthly statement, old_balance in cents """
+    rnd = random.Random(seed)
+    first_day = date(year, month, 1)
+    last_day = (first_day + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    iban = f"DE12 5001 0517 {account_number[:4]} {account_number[4:8]} {account_number[8:10]}"
+
+    statement = BankStatement(statement_number=statement_number, statement_date=f"{last_day.isoformat()}T00:00:00",
+                              statement_month=month, statement_year=year, account_id=iban.replace(" ", ""),
+                              bank_id="INGDDEFFXXX")
+    balance = old_balance
+    booking_lines = list()
+    for idx in range(transactions):
+        tr_type, issuer = rnd.choice(ISSUERS)
+        cents = rnd.randint(100, 250000) if tr_type in ("Gutschrift", "Gehalt/Rente", "Retoure") \
+            else -rnd.randint(50, 40000)
+        booking = first_day + timedelta(days=idx * (last_day.day - 1) // max(1, transactions))
+        valuta = booking + timedelta(days=rnd.choice((0, 0, 1)))
+        description = [f"Mandat: M{rnd.randint(10000, 99999)} Referenz: {year}{month:02d}{idx:05d}",
+                       f"Verwendungszweck {rnd.randint(1, 999)} Kd-Nr. {rnd.randint(100000, 999999)}"][
+                      :rnd.randint(1, 2)]
+        balance += cents
+
+        statement.add_transaction(Transaction(
+            date=f"{booking.isoformat()}T00:00:00", valuta=f"{valuta.isoformat()}T00:00:00", issuer=issuer,
+            type=tr_type, description="\n".join(description), amount=cents / 100))
+        booking_lines.append([f"{format_date(booking)} {tr_type} {issuer} {format_amount(cents)}",
+                              f"{format_date(valuta)} {description[0]}"] + description[1:])
+
+    statement.statement_old_balance = old_balance / 100
+    statement.statement_balance = balance / 100
+
+    chunks = [booking_lines[i:i + transactions_per_page] for i in range(0, len(booking_lines), transactions_per_page)]
+    chunks = chunks or [[]]
+    num_pages = len(chunks) + notice_pages
+    pages = list()
+    for page_idx, chunk in enumerate(chunks):
+        page = [
+            f"Girokonto Nummer {account_number}",
+            f"Kontoauszug {month_name(month)} {year}",
+            f"Datum {format_date(last_day)}",
+            f"Auszugsnummer {statement_number}",
+            f"IBAN {iban}",
+            "BIC INGDDEFFXXX",
+            f"Seite {page_idx + 1} von {num_pages}",
+        ]
+        if page_idx == 0:
+            page.append(f"Alter Saldo {format_amount(old_balance)} Euro")
+        page += ["Buchung Buchung / Verwendungszweck Betrag (EUR)", "Valuta"]
+        for lines in chunk:
+            page += lines
+        if page_idx == len(chunks) - 1:
+            page += [f"Neuer Saldo {format_amount(balance)} Euro", "Kunden-Information",
+                     "Vorliegender Freistellungsauftrag"]
+        pages.append(page)
+
+    for notice_idx in range(notice_pages):
+        pages.append([f"Seite {len(chunks) + notice_idx + 1} von {num_pages}"] + list(NOTICE_LINES) * 10)
+
+    file_name = f"Girokonto_{account_number}_Kontoauszug_{last_day.strftime('%Y%m%d')}.pdf"
+    return SyntheticStatement(statement=statement, pages=pages, file_name=file_name)
+
+
+def _pdf_string(text: str) -> bytes:
+    return b"(" + text.encode("cp1252").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def write_pdf(out_file: Union[str, Path], pages: List[List[str]]):
+    """ Write a minimal PDF with one text line per line of every page, no dependencies required """
+    num_pages = len(pages)
+    font_id = 3 + 2 * num_pages
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(num_pages))}] "
+        f"/Count {num_pages} >>".encode(),
+    ]
+    for idx, lines in enumerate(pages):
+        content = b"BT /F1 8 Tf 10 TL 40 810 Td " + b" ".join(_pdf_string(line) + b" Tj T*" for line in lines) + b" ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 {font_id} "
+                       f"0 R >> >> /Contents {4 + 2 * idx} 0 R >>".encode())
+        objects.append(f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = list()
+    for idx, obj in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{idx} 0 obj\n".encode() + obj + b"\nendobj\n"
+
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    Path(out_file).write_bytes(bytes(data))
+
+
+def generate_folder(directory: Union[str, Path], statements: int = 12, transactions: int = 30,
+                    transactions_per_page: int = 25, start_year: int = 2018, seed: int = 0,
+                    account_number: str = "5422021297") -> List[SyntheticStatement]:
+    """ Write consecutive monthly statement PDFs into directory """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    results = list()
+    balance = 250000
+    for idx in range(statements):
+        year, month = start_year + idx // 12, idx % 12 + 1
+        synthetic = generate_statement(year, month, month, transactions, transactions_per_page, balance,
+                                       account_number=account_number, seed=seed + idx)
+        write_pdf(directory / synthetic.file_name, synthetic.pages)
+        balance = round(synthetic.statement.statement_balance * 100)
+        results.append(synthetic)
+    return results
@@ -0,0 +1,485 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from ing_parser.aio import AsyncStatementParser
+from ing_parser.batch import FileLimits, IsolatedParser
+from ing_parser.benchmark import run_benchmarks
+from ing_parser import cache as statement_cache
+from ing_parser.cache import StatementCache, file_hash
+from ing_parser.categorize import Categorizer, CategoryRule
+from ing_parser.data import BankStatement, Transaction, TransactionStore, parse_cents
+from ing_parser.dates import parse_month, to_iso_date
+from ing_parser.dedup import Deduplicator
+from ing_parser.folder import IngStatementsFolder
+from ing_parser.io import ez, merge, yaffa
+from ing_parser.io.writer import write_dataframe, write_transactions_csv, newest_first
+from ing_parser import source
+from ing_parser.profiling import Profiler
+from ing_parser.reconcile import reconcile_statements
+from ing_parser.statement import IngStatement, add_statement_year, transactions_to_dataframe
+from ing_parser.store import TransactionDatabase
+from ing_parser.sync import IncrementalSync, Manifest
+from ing_parser.synthetic import generate_statement, generate_folder, write_pdf
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+)
+
+
+def _booking(t):
+    return t.date, t.valuta, t.issuer, t.type, t.description, t.amount
+
+
+def test_synthetic_statement(tmp_path: Path):
+    synthetic = generate_statement(2020, 3, 3, transactions=60, transactions_per_page=25, seed=3)
+    pdf_file = tmp_path / synthetic.file_name
+    write_pdf(pdf_file, synthetic.pages)
+
+    statement = IngStatement(pdf_file)
+    statement.parse_ing_bank_statement()
+    expected = synthetic.statement
+
+    assert [_booking(t) for t in statement.transactions] == [_booking(t) for t in expected.transactions]
+    assert statement.statement_number == expected.statement_number
+    assert statement.statement_date == expected.statement_date
+    assert (statement.statement_year, statement.statement_month) == (expected.statement_year, expected.statement_month)
+    assert statement.statement_balance == expected.statement_balance
+    assert statement.statement_old_balance == expected.statement_old_balance
+    assert statement.account_id == expected.account_id
+    # -- The trailing notice page is not extracted
+    assert len(statement.page_timings) == len(synthetic.pages) - 1
+
+
+def test_in_memory_sources(tmp_path: Path, monkeypatch):
+    synthetic = generate_statement(2020, 4, 4, transactions=30, seed=3)
+    pdf_file = tmp_path / synthetic.file_name
+    write_pdf(pdf_file, synthetic.pages)
+    data = pdf_file.read_bytes()
+    expected = [_booking(t) for t in synthetic.statement.transactions]
+
+    monkeypatch.setattr(source, "MMAP_THRESHOLD", 0)
+    for pdf_source in (pdf_file, data, memoryview(data), bytearray(data), io.BytesIO(data)):
+        statement = IngStatement(pdf_source)
+        statement.parse_ing_bank_statement()
+        assert [_booking(t) for t in statement.transactions] == expected
+
+
+def test_synthetic_folder(tmp_path: Path):
+    synthetic = generate_folder(tmp_path, statements=3, transactions=20)
+    expected = sum(len(s.statement.transactions) for s in synthetic)
+
+    for executor in ("thread", "process"):
+        folder = IngStatementsFolder(tmp_path, executor=executor, max_workers=2)
+        assert len(folder.dataframe) == expected
+        expected_numbers = [s.statement.statement_number for s in synthetic]
+        assert sorted(s.statement_number for s in folder.statements) == expected_numbers
+
+
+def test_statement_cache(tmp_path: Path, monkeypatch):
+    # -- A zero balance used to leave the raw regex match in the header, which could not be cached
+    synthetic = generate_statement(2020, 5, 5, transactions=20, old_balance=0, seed=4)
+    pdf_file = tmp_path / synthetic.file_name
+    write_pdf(pdf_file, synthetic.pages)
+    cache = StatementCache(tmp_path / "cache")
+    content_hash = file_hash(pdf_file)
+
+    parsed = IngStatement(pdf_file, cache)
+    parsed.parse_ing_bank_statement()
+    restored = cache.get_statement(content_hash, "statement_pages")
+    assert restored.statement_old_balance == 0.0 and restored.statement_month == 5
+    assert list(restored.transactions) == list(parsed.transactions)
+    assert cache.get_lines(content_hash, "statement_pages") is not None
+    # -- A header value that cannot be serialised is not cached instead of aborting the parse
+    cache.put_lines("unserialisable", [object()])
+    assert cache.get_lines("unserialisable") is None
+
+    # -- Another extraction variant or parser version misses, changed results are never served
+    assert cache.get_statement(content_hash, "all_pages") is None
+    monkeypatch.setattr(statement_cache, "PARSER_VERSION", statement_cache.PARSER_VERSION + 1)
+    assert cache.get_statement(content_hash, "statement_pages") is None
+    reparsed = IngStatement(pdf_file, cache)
+    reparsed.parse_ing_bank_statement()
+    assert list(reparsed.transactions) == list(parsed.transactions)
+
+
+def test_statement_cache_eviction(tmp_path: Path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(statement_cache, "time", SimpleNamespace(time=lambda: next(clock)))
+    cache = StatementCache(tmp_path)
+    lines = [f"line {idx}" for idx in range(50)]
+    cache.put_lines("a", lines)
+    with cache._connect() as con:
+        cache.max_size = 3 * con.execute("SELECT size FROM entries").fetchone()[0]
+
+    cache.put_lines("b", lines)
+    assert cache.get_lines("a") == lines
+    cache.put_lines("c", lines)
+    cache.put_lines("d", lines)
+    # -- The least recently used entry goes first, a read refreshes an entry
+    assert [name for name in "abcd" if cache.get_lines(name) is None] == ["b"]
+
+
+def test_statement_cache_fallback(tmp_path: Path):
+    synthetic = generate_statement(2020, 6, 6, transactions=10, seed=6)
+    pdf_file = tmp_path / synthetic.file_name
+    write_pdf(pdf_file, synthetic.pages)
+    (tmp_path / "corrupt").mkdir()
+    (tmp_path / "corrupt" / "statements.sqlite").write_bytes(b"not a database" * 100)
+    (tmp_path / "file").write_bytes(b"")
+
+    for cache_dir in (tmp_path / "corrupt", tmp_path / "file" / "cache"):
+        cache = StatementCache(cache_dir)
+        statement = IngStatement(pdf_file, cache)
+        statement.parse_ing_bank_statement()
+        assert cache.disabled and len(statement.transactions) == 10
+
+
+def _full_rebuild(directory: Path, out_file: Path) -> str:
+    statements = IngStatementsFolder(directory).parse_statements()
+    write_transactions_csv(out_file, newest_first(TransactionStore.concat(s.transactions for s in statements)))
+    return out_file.read_text(encoding="utf-8")
+
+
+def test_incremental_sync(tmp_path: Path):
+    pdf_dir, out_file = tmp_path / "pdf", tmp_path / "out.csv"
+    synthetic = generate_folder(pdf_dir, statements=4, transactions=15)
+    (pdf_dir / synthetic[3].file_name).unlink()
+
+    def sync() -> int:
+        parsed = IncrementalSync(IngStatementsFolder(pdf_dir), out_file).run()
+        assert out_file.read_text(encoding="utf-8") == _full_rebuild(pdf_dir, tmp_path / "full.csv")
+        return parsed
+
+    assert sync() == 3 and sync() == 0
+    manifest = Manifest.load(tmp_path / "out.csv.manifest.json")
+    assert sorted(e.statement_number for e in manifest.entries.values()) == [1, 2, 3]
+    assert sum(len(e.rows) for e in manifest.entries.values()) == 45
+
+    # -- Added, changed and removed files
+    write_pdf(pdf_dir / synthetic[3].file_name, synthetic[3].pages)
+    changed = pdf_dir / synthetic[1].file_name
+    write_pdf(changed, generate_statement(2018, 2, 2, transactions=9, seed=42).pages)
+    os.utime(changed, (changed.stat().st_atime, changed.stat().st_mtime + 10))
+    (pdf_dir / synthetic[0].file_name).unlink()
+    assert sync() == 2
+
+    # -- A file that failed is not added to the manifest and parsed again by the next run
+    broken = pdf_dir / synthetic[0].file_name
+    broken.write_bytes(b"%PDF-1.4 truncated")
+    folder = IngStatementsFolder(pdf_dir, max_workers=1, limits=FileLimits(timeout=60))
+    assert IncrementalSync(folder, out_file).run() == 1 and len(folder.errors.errors) == 1
+    assert str(broken) not in Manifest.load(tmp_path / "out.csv.manifest.json").entries
+    write_pdf(broken, synthetic[0].pages)
+    assert sync() == 1
+
+    # -- An unreadable manifest rebuilds the output
+    (tmp_path / "out.csv.manifest.json").write_text("{", encoding="utf-8")
+    assert sync() == 4
+
+    # -- An output with an unexpected header is rebuilt from all files, not only the changed ones
+    out_file.write_text("Foreign;Header\n", encoding="utf-8")
+    assert sync() == 4
+
+
+def test_transaction_store():
+    expected = list(generate_statement(2021, 4, 4, transactions=30, seed=5).statement.transactions)
+    store = TransactionStore(expected)
+
+    assert len(store) == 30 and store == expected
+    assert store[-1] == expected[-1] and store[2:5] == expected[2:5]
+    assert pickle.loads(pickle.dumps(store)) == expected
+    assert TransactionStore.concat([store, store]) == expected * 2
+
+
+def test_partitioned_output(tmp_path: Path):
+    generate_folder(tmp_path / "pdf", statements=14, transactions=5)
+    folder = IngStatementsFolder(tmp_path / "pdf")
+    df = add_statement_year(folder.dataframe, folder.statements)
+
+    written = write_dataframe(df, tmp_path / "out", "jsonl", partition_cols=["statement_year"])
+    assert [f.parent.name for f in written] == ["statement_year=2018", "statement_year=2019"]
+    assert sum(len(pd.read_json(f, lines=True)) for f in written) == 70
+
+
+def test_transaction_database(tmp_path: Path):
+    statements = [s.statement for s in generate_folder(tmp_path, statements=3, transactions=20)]
+    db = TransactionDatabase(tmp_path / "transactions.sqlite")
+    db.upsert_statements(statements)
+    db.upsert_statements(statements[:1])
+
+    assert len(db.transactions()) == 60
+    assert [s.statement_balance for s in db.statements()] == [s.statement_balance for s in statements]
+    debits = db.transactions(type="Lastschrift", year=2018)
+    expected = [t for s in statements for t in s.transactions if t.type == "Lastschrift"]
+    assert sorted(_booking(t) for t in debits) == sorted(_booking(t) for t in expected)
+    assert len(db.transactions(date_from="2018-02-01", date_to="2018-02-28")) == 20
+
+
+def test_multi_account_folder(tmp_path: Path):
+    generate_folder(tmp_path / "giro", statements=2, transactions=10)
+    generate_folder(tmp_path / "extra" / "2018", statements=3, transactions=5, account_number="5510000001")
+
+    folder = IngStatementsFolder(tmp_path, account_type="all", recursive=True, max_workers=2)
+    accounts = folder.account_dataframes()
+    assert {account: len(df) for account, df in accounts.items()} == {
+        "DE12500105175422021297": 20, "DE12500105175510000001": 15}
+    assert len(IngStatementsFolder(tmp_path / "giro").find_files()) == 2
+
+
+def test_deduplication(tmp_path: Path):
+    synthetic = generate_folder(tmp_path, statements=3, transactions=10)
+    first = tmp_path / synthetic[0].file_name
+    (tmp_path / first.name.replace(".pdf", " (1).pdf")).write_bytes(first.read_bytes())
+    # -- Same statement as the second one, but a different PDF
+    again = generate_statement(2018, 2, 2, transactions=10, seed=99)
+    write_pdf(tmp_path / synthetic[1].file_name.replace(".pdf", "_2.pdf"), again.pages)
+
+    folder = IngStatementsFolder(tmp_path, deduplicate=True)
+    assert [s.statement_number for s in folder.parse_statements()] == [1, 2, 3]
+    report = folder.deduplicator.report
+    assert (len(report.files), len(report.statements), len(report.bookings)) == (1, 1, 0)
+
+    coffee = Transaction("2021-03-01", "2021-03-01", "Cafe", "Lastschrift", "Kaffee", -3.2)
+    rent = Transaction("2021-03-02", "2021-03-02", "Vermieter", "Ueberweisung", "Miete", -900.0)
+    deduplicator = Deduplicator()
+    march = deduplicator.filter_statement(BankStatement(3, account_id="DE1", transactions=TransactionStore(
+        [coffee, coffee, rent])), "march.pdf")
+    overlap = deduplicator.filter_statement(BankStatement(4, account_id="DE1", transactions=TransactionStore(
+        [coffee, coffee, coffee, rent])), "march_copy.pdf")
+    # -- Identical bookings within a statement are kept, only those already seen in an earlier one are dropped
+    assert len(march.transactions) == 3 and list(overlap.transactions) == [coffee]
+    assert len(deduplicator.report.bookings) == 3
+
+    # -- A DataFrame read before filtering is rebuilt without the dropped bookings
+    statement = IngStatement(tmp_path / synthetic[2].file_name)
+    assert len(statement.dataframe) == 10
+    earlier = BankStatement(1, account_id=statement.account_id, transactions=statement.transactions[:1])
+    deduplicator.filter_statement(earlier, "earlier.pdf")
+    deduplicator.filter_statement(statement, statement.source_file)
+    assert len(statement.dataframe) == len(statement.transactions) == 9
+
+
+def test_isolated_batch(tmp_path: Path, monkeypatch):
+    generate_folder(tmp_path, statements=3, transactions=10)
+    broken = tmp_path / "Girokonto_5422021297_Kontoauszug_20180215.pdf"
+    broken.write_bytes(b"%PDF-1.4 truncated")
+
+    folder = IngStatementsFolder(tmp_path, max_workers=2, limits=FileLimits(timeout=60))
+    assert [s.statement_number for s in folder.parse_statements()] == [1, 2, 3]
+    assert [(e.file, e.stage) for e in folder.errors.errors] == [(str(broken), "open")]
+    assert [s.statement_number for s in folder.iter_parsed_statements()] == [1, 2, 3]
+    assert folder.errors.files == 4 and len(folder.errors.errors) == 1
+
+    # -- Files that finish while the consumer is suspended are not reported as timeouts
+    generate_folder(tmp_path / "slow", statements=6, transactions=10)
+    parser = IsolatedParser(FileLimits(timeout=1), max_workers=2)
+    results = parser.iter_parse(sorted((tmp_path / "slow").glob("*.pdf")), window=4)
+    next(results)
+    time.sleep(1.5)
+    assert None not in [statement for _, statement in results] and not parser.report.errors
+
+    if multiprocessing.get_start_method() == "fork":
+        # -- Without address space limits, e.g. on macOS, files are parsed without a memory limit
+        import resource
+
+        def unsupported(*_):
+            raise ValueError("not allowed")
+
+        monkeypatch.setattr(resource, "setrlimit", unsupported)
+        parser = IsolatedParser(FileLimits(memory=1 << 30), max_workers=1)
+        assert None not in parser.parse(sorted((tmp_path / "slow").glob("*.pdf"))) and not parser.report.errors
+
+        # -- Forked workers inherit the patched extraction, which hangs on the second file
+        iter_pdf_lines = IngStatement._iter_pdf_lines
+        monkeypatch.setattr(IngStatement, "_iter_pdf_lines", lambda self: time.sleep(60) if "20180228" in
+                            self.source_file.name else iter_pdf_lines(self))
+        parser = IsolatedParser(FileLimits(timeout=1), max_workers=3)
+        results = parser.parse(sorted(tmp_path.glob("*.pdf")))
+        assert [r is None for r in results] == [False, True, True, False]
+        assert [e.stage for e in parser.report.errors] == ["open", "parse"]
+        assert parser.report.errors[1].exception == "TimeoutError"
+
+
+def test_async_parser(tmp_path: Path):
+    synthetic = generate_folder(tmp_path, statements=4, transactions=15)
+
+    async def parse():
+        uploads = [f.read_bytes() for f in sorted(tmp_path.glob("*.pdf"))]
+        async with AsyncStatementParser(max_workers=2, executor="thread", max_pending=1) as parser:
+            uploaded = await asyncio.gather(*(parser.parse_statement(data) for data in uploads))
+            parsed = [statement async for _, statement in parser.iter_folder(tmp_path)]
+            pending = parser.pending
+
+        async with AsyncStatementParser(max_workers=1, executor="process", timeout=60) as parser:
+            streamed = await parser.parse_statement(io.BytesIO(uploads[0]))
+            # -- An explicit zero timeout is not replaced by the default
+            with pytest.raises(asyncio.TimeoutError):
+                await parser.parse_statement(uploads[1], timeout=0)
+        return uploaded + [streamed], parsed, pending
+
+    uploaded, parsed, pending = asyncio.run(parse())
+    assert [s.statement_number for s in uploaded] == [s.statement.statement_number for s in synthetic] + [1]
+    assert sorted(len(s.transactions) for s in parsed) == [15] * 4
+    assert pending == 0
+
+
+def test_reconciliation(tmp_path: Path):
+    generate_folder(tmp_path, statements=14, transactions=10)
+    folder = IngStatementsFolder(tmp_path)
+    folder.parse()
+    assert reconcile_statements(folder.statements) == []
+
+    statements = sorted(folder.statements, key=lambda s: (s.statement_year, s.statement_number))
+    del statements[3]
+    statements[5].statement_balance += 0.01
+    issues = reconcile_statements(statements)
+    assert [(i.check, i.statement_number) for i in issues] == [
+        ("balance", 7), ("number_sequence", 5), ("balance_chain", 5), ("balance_chain", 8)]
+
+    # -- A statement without the closing balance is reported, not checked against a balance of 0.0
+    synthetic = generate_statement(2021, 6, 6, transactions=5, seed=6)
+    pages = [[line for line in page if not line.startswith("Neuer Saldo")] for page in synthetic.pages]
+    write_pdf(tmp_path / "missing.pdf", pages)
+    statement = IngStatement(tmp_path / "missing.pdf")
+    statement.parse_ing_bank_statement()
+    assert statement.statement_balance is None
+    issues = reconcile_statements([statement.to_bank_statement()])
+    assert [(i.check, i.message) for i in issues] == [("balance", "Old or new balance missing in the statement header")]
+
+
+def test_amount_cents():
+    assert [parse_cents(a) for a in ("-1.234,56", "0,05", "12.000,00", "7,5")] == [-123456, 5, 1200000, 750]
+
+    statement = generate_statement(2021, 4, 4, transactions=300, seed=5).statement
+    df = transactions_to_dataframe(statement.transactions, cents=True)
+    assert df["amount"].dtype == "int64"
+    assert df["amount"].sum() == round((statement.statement_balance - statement.statement_old_balance) * 100)
+
+
+def test_dates():
+    assert to_iso_date("29.02.2024") == "2024-02-29T00:00:00"
+    assert to_iso_date("1.3.2024") == "2024-03-01T00:00:00"
+    assert [parse_month(name, "2023").month for name in ("März", "Maerz", "mai", "Dezember")] == [3, 3, 5, 12]
+    assert parse_month("March", "2023") is None
+    with pytest.raises(ValueError):
+        to_iso_date("31.04.2024")
+
+
+def test_categorizer():
+    rules = [
+        CategoryRule("Groceries", "Food", keywords=["rewe", "rewe markt"], max_amount=0),
+        CategoryRule("Housing", "Rent", issuer="^hausverwaltung", description=r"miete\s+\d{4}"),
+        CategoryRule("Utilities", "Internet/Cable", keywords=["markt"]),
+        CategoryRule("Salary", "Main Job", type="Gehalt/Rente", min_amount=1000),
+    ]
+    categorizer = Categorizer(rules, system="system3")
+    transactions = TransactionStore([
+        Transaction("2021-01-02", "", "REWE Markt GmbH", "Lastschrift", "Einkauf", -23.5),
+        Transaction("2021-01-02", "", "REWE Markt GmbH", "Retoure", "Einkauf", 5.0),
+        Transaction("2021-01-03", "", "Hausverwaltung Schmidt", "Ueberweisung", "Miete 2021\nJanuar", -850.0),
+        Transaction("2021-01-03", "", "Hausverwaltung Schmidt", "Ueberweisung", "Nebenkosten", -120.0),
+        Transaction("2021-01-31", "", "ACME GmbH", "Gehalt/Rente", "Lohn", 2500.0),
+        Transaction("2021-01-31", "", "ACME GmbH", "Gehalt/Rente", "Erstattung", 12.0),
+    ])
+    assert [r.name if r else None for r in categorizer.categorize(transactions)] == [
+        "Groceries:Food", "Utilities:Internet/Cable", "Housing:Rent", None, "Salary:Main Job", None]
+
+    statement = generate_statement(2021, 1, 1, transactions=40, seed=4).statement
+    yaffa_statement = yaffa.convert_statement_to_yaffa(statement, categorizer)
+    categories = {t.category for t in yaffa_statement.transactions if t.account_from == "REWE Markt GmbH"}
+    assert categories and categories <= {"Groceries:Food", "Utilities:Internet/Cable"}
+    with pytest.raises(ValueError):
+        Categorizer([CategoryRule("Housing", "Rent")], system="system1")
+
+
+def test_batch_export():
+    statements = [generate_statement(2021, month, month, transactions=30, seed=month).statement for month in (1, 2)]
+    for cents in (False, True):
+        rows = [e.to_row() for s in statements for e in ez.EzBookKeepingTransactions.from_bank_statement(s, cents)]
+        assert list(ez.convert_to_ez_dataframe(statements, cents).itertuples(index=False, name=None)) == rows
+
+    expected = pd.concat([s.dataframe for s in yaffa.convert_to_yaffa(statements)], ignore_index=True)
+    pd.testing.assert_frame_equal(yaffa.yaffa_dataframe(statements), expected)
+
+
+def test_ordered_streaming(tmp_path: Path):
+    generate_folder(tmp_path, statements=6, transactions=10)
+    for executor in ("thread", "process"):
+        folder = IngStatementsFolder(tmp_path, executor=executor, max_workers=3)
+        statements = list(folder.iter_parsed_statements(window=2))
+        assert [s.statement_date for s in statements] == sorted(s.statement_date for s in statements)
+        assert [s.statement_number for s in statements] == list(range(1, 7))
+
+    # -- Leaving early cancels the remaining files
+    iterator = IngStatementsFolder(tmp_path).iter_parsed_statements(window=2)
+    assert next(iterator).statement_number == 1
+    iterator.close()
+
+
+def test_external_merge(tmp_path: Path, monkeypatch):
+    generate_folder(tmp_path, statements=5, transactions=30, transactions_per_page=25)
+    folder = IngStatementsFolder(tmp_path)
+    write_transactions_csv(tmp_path / "expected.csv", newest_first(folder.iter_transactions()))
+
+    # -- Forces an intermediate merge pass
+    monkeypatch.setattr(merge, "MERGE_FAN_IN", 3)
+    num_rows = merge.write_sorted_transactions_csv(tmp_path / "merged.csv", folder.iter_transactions(), chunk_size=7)
+    assert num_rows == 150
+    assert (tmp_path / "merged.csv").read_bytes() == (tmp_path / "expected.csv").read_bytes()
+
+
+def test_lazy_imports():
+    # -- The command line and the parser load pandas, numpy and pypdf only once they are needed
+    code = "import sys, scripts.ing_parse_script; print(sorted({'pandas', 'numpy', 'pypdf'} & set(sys.modules)))"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(Path(__file__).parents[1]), *sys.path]))
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_profiler(tmp_path: Path):
+    synthetic = generate_folder(tmp_path, statements=2, transactions=30, transactions_per_page=20)
+
+    for executor in ("thread", "process"):
+        profiler = Profiler()
+        IngStatementsFolder(tmp_path, executor=executor, max_workers=2, profiler=profiler).parse()
+        profiles = profiler.files.values()
+        assert sum(p.transactions for p in profiles) == 60
+        assert sorted((p.pages, p.pages_extracted) for p in profiles) == \
+               sorted((len(s.pages), len(s.pages) - 1) for s in synthetic)
+        assert {"parse_files", "extract_text", "classify"} <= set(profiler.stage_totals())
+
+    # -- Statements restored from the cache keep their counts, nothing is extracted
+    cache = StatementCache(tmp_path / "cache")
+    parsed, restored = Profiler(), Profiler()
+    for profiler in (parsed, restored):
+        IngStatementsFolder(tmp_path, cache=cache, profiler=profiler).parse()
+    counts = [sorted((p.pages, p.lines, p.transactions) for p in profiler.files.values())
+              for profiler in (parsed, restored)]
+    assert counts[0] == counts[1] and sum(p.pages_extracted for p in restored.files.values()) == 0
+    assert "cache_restore" in restored.stage_totals() and "extract_text" not in restored.stage_totals()
+
+    # -- An abandoned iterator does not leave the timed parser methods on the statement
+    statement = IngStatement(tmp_path / synthetic[0].file_name, profiler=Profiler())
+    transactions = statement.iter_transactions()
+    next(transactions)
+    transactions.close()
+    assert "_classify_line" not in vars(statement)
+
+
+def test_benchmark_report():
+    report = run_benchmarks(statements=2, transactions=10, repeat=1, stages=["read_pdf", "parse_lines"])
+    assert set(report["results"]) == {"read_pdf", "parse_lines"}
+    assert report["counts"]["transactions"] == 20